@@ -1,10 +1,6 @@
 from fastapi import APIRouter
 
 from api.endpoints import achievement, item, user
-from core.auth import VerifyUserID
-
-auth = VerifyUserID()
-
 
 router = APIRouter(prefix="/api/v1")
 
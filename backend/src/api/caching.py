@@ -0,0 +1,24 @@
+from fastapi import Request, Response
+
+from core.reference import Serialized
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match matches `etag`."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    return if_none_match.strip() == "*" or etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    )
+
+
+def json_response(request: Request, serialized: Serialized) -> Response:
+    """
+    Responds with precomputed JSON, or with 304 if the client has it already.
+    Clients must revalidate, as the data may change at any time.
+    """
+    headers = {"ETag": serialized.etag, "Cache-Control": "no-cache"}
+    if not_modified(request, serialized.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(serialized.body, media_type="application/json", headers=headers)
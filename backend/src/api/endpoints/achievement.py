@@ -1,39 +1,55 @@
-from fastapi import APIRouter, HTTPException, Security
+from fastapi import APIRouter, HTTPException, Request, Security
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from core.auth import VerifyUserID
+from api.caching import json_response
+from core.auth import auth
+from core.config import settings
 from core.db import SessionDep
 from core.models.achievement import (
     Achievement,
     AchievementRequest,
     AchievementResponse,
 )
-
-auth = VerifyUserID()
+from core.reference import ReferenceCache
 
 router = APIRouter(prefix="/achievements")
 
 
+async def _load_achievements(session: AsyncSession) -> list[AchievementResponse]:
+    achievements = await session.exec(select(Achievement).order_by(Achievement.id))
+    return [achievement.into_response() for achievement in achievements.all()]
+
+
+achievement_catalog = ReferenceCache(
+    "achievement",
+    _load_achievements,
+    key=lambda achievement: achievement.id,
+    ttl_seconds=settings.achievement_cache_ttl_seconds,
+)
+
+
 @router.get("/", response_model=list[AchievementResponse])
-def list_all_achievements(session: SessionDep):
-    achievements = session.exec(select(Achievement)).all()
-    return [achievement.into_response() for achievement in achievements]
+async def list_all_achievements(request: Request, session: SessionDep):
+    catalog = await achievement_catalog.get(session)
+    return json_response(request, catalog.all)
 
 
 @router.get("/{achievement_id}", response_model=AchievementResponse)
-def get_achievement(achievement_id: int, session: SessionDep):
-    achievement = session.get(Achievement, achievement_id)
+async def get_achievement(achievement_id: int, request: Request, session: SessionDep):
+    catalog = await achievement_catalog.get(session)
+    achievement = catalog.by_key.get(achievement_id)
 
     if not achievement:
         raise HTTPException(
             status_code=404, detail="No achievement with given id found"
         )
 
-    return achievement.into_response()
+    return json_response(request, achievement)
 
 
 @router.post("/", response_model=AchievementResponse)
-def create_achievement(
+async def create_achievement(
     achievement: AchievementRequest,
     session: SessionDep,
     user_id: str = Security(auth, scopes=["create:achievements"]),
@@ -42,6 +58,8 @@ def create_achievement(
         Achievement(**achievement.model_dump())
     )
     session.add(saved_achievement)
-    session.commit()
-    session.refresh(saved_achievement)
+    await achievement_catalog.notify_changed(session)
+    await session.commit()
+    await session.refresh(saved_achievement)
+    achievement_catalog.invalidate()
     return AchievementResponse(**saved_achievement.model_dump())
@@ -1,39 +1,63 @@
 import os
+from dataclasses import astuple
 from datetime import datetime
-from io import BytesIO
+from functools import partial
 from pathlib import Path
 from typing import Annotated, List
 from uuid import uuid4
 
-import aiofiles
-from fastapi import APIRouter, Form, HTTPException, Query, Security, UploadFile
-from fastapi.concurrency import run_in_threadpool
+from fastapi import (
+    APIRouter,
+    Depends,
+    Form,
+    HTTPException,
+    Query,
+    Response,
+    Security,
+    UploadFile,
+)
 from geoalchemy2 import WKTElement
 from geoalchemy2 import functions as geofunc
-from PIL import Image
 from pydantic import TypeAdapter
 from pydantic_core import ValidationError
-from sqlmodel import or_, select
+from sqlalchemy import String, cast, distinct
+from sqlalchemy.orm import InstrumentedAttribute, selectinload
+from sqlmodel import col, func, or_, select, tuple_
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from core.auth import VerifyUserID
+from core.achievements import record_activity
+from core.auth import auth
 from core.config import settings
 from core.db import SessionDep
-from core.detection.detection import get_bounding_boxes
+from core.derivatives import schedule_derivatives
+from core.detection.backends import get_backend
+from core.detection.detection import (
+    DetectionStats,
+    get_bounding_boxes,
+    get_detection_stats,
+)
+from core.images import decode_image, read_image_size
+from core.models.enums import AchievementMetric, ItemOrder
 from core.models.item import (
     BoundingBox,
     BoundingBoxRequest,
     BoundingBoxResponse,
     Item,
+    ItemClusterResponse,
     ItemCreate,
+    ItemFilters,
     ItemResponse,
-    ItemType,
+    item_geometry,
 )
 from core.models.message import Message, MessageRequest, MessageResponse
 from core.models.user import ensure_user
+from core.pagination import decode_cursor, encode_cursor
+from core.storage import image_storage
+from core.tiles import TILE_EXTENT, TILE_MEDIA_TYPE, tile_cache
+from core.timing import StageTimer
+from core.uploads import inspect_upload, save_upload
 from core.utils import validate_user_id
 
-auth = VerifyUserID()
-
 router = APIRouter(prefix="/items")
 
 
@@ -56,22 +80,7 @@ def _validate_image_metadata(image: UploadFile):
 
 
 def _validate_saved_image(image_path: Path, bounding_boxes: list[BoundingBoxRequest]):
-    if os.path.getsize(image_path) > settings.max_file_size:
-        raise HTTPException(
-            400,
-            f"File too large. Maximum file size is {settings.max_file_size}, "
-            f"got {os.path.getsize(image_path)}",
-        )
-
-    try:
-        image = Image.open(image_path)
-        image.verify()
-
-        image = Image.open(image_path)  # Note: PIL closes image after verify()
-        width, height = image.size
-
-    except (IOError, ValueError):
-        raise HTTPException(400, "Invalid or corrupted image")
+    width, height = read_image_size(image_path)
 
     if len(bounding_boxes) == 0:
         raise HTTPException(400, "No bounding boxes provided.")
@@ -98,23 +107,18 @@ async def _validate_and_save_submission(
 
     _validate_image_metadata(item.image)
 
-    image_ext = item.image.filename.split(".")[-1].lower()
-    image_path = Path("/image") / f"{uuid4().hex}.{image_ext}"
-
-    image_path.parent.mkdir(parents=True, exist_ok=True)
+    upload_path = Path("/image/.uploads") / uuid4().hex
 
     try:
-        async with aiofiles.open(image_path, "wb+") as f:
-            while image_chunk := await item.image.read(1024 * 1024):  # 1 MB
-                await f.write(image_chunk)
-
-        _validate_saved_image(image_path, bounding_boxes)
+        upload = await save_upload(item.image, upload_path)
+        _validate_saved_image(upload_path, bounding_boxes)
 
-        return image_path.as_posix()
+        key = image_storage.put(upload_path, upload.sha256, upload.image_format)
+        return image_storage.public_path(key)
 
     except Exception as e:
         try:
-            os.remove(image_path)
+            os.remove(upload_path)
         except OSError:
             pass
 
@@ -124,6 +128,98 @@ async def _validate_and_save_submission(
             raise HTTPException(500, f"Error while processing image: {str(e)}")
 
 
+async def _get_item(
+    session: AsyncSession, item_id: int, reload: bool = False, lock: bool = False
+) -> Item | None:
+    """
+    Fetches an item together with its bounding boxes, so that `into_response`
+    does not load them lazily. `reload` refreshes an item already in the
+    session, e.g. after a commit. `lock` locks the item's row until the end of
+    the transaction.
+    """
+    return await session.get(
+        Item,
+        item_id,
+        options=[selectinload(Item.bounding_boxes)],
+        populate_existing=reload,
+        with_for_update=lock,
+    )
+
+
+async def _reload_item(session: AsyncSession, item_id: int) -> Item:
+    """Refreshes an item this request has just committed."""
+    item = await _get_item(session, item_id, reload=True)
+    assert item is not None, f"Item {item_id} disappeared after commit"
+    return item
+
+
+# Sort column (besides the id tie-breaker) and whether it is descending
+_ITEM_ORDERS: dict[ItemOrder, tuple[InstrumentedAttribute | None, bool]] = {
+    ItemOrder.id: (None, False),
+    ItemOrder.newest: (col(Item.uploaded_at), True),
+    ItemOrder.oldest: (col(Item.uploaded_at), False),
+    ItemOrder.created_newest: (col(Item.created_at), True),
+    ItemOrder.created_oldest: (col(Item.created_at), False),
+}
+
+
+def _sort_key(item: Item, order: ItemOrder) -> list:
+    column, _ = _ITEM_ORDERS[order]
+    return [item.id] if column is None else [getattr(item, column.key), item.id]
+
+
+def _apply_order(query, order: ItemOrder, cursor: str | None):
+    """Sorts the query by `order` and skips rows up to `cursor`, if given."""
+    column, descending = _ITEM_ORDERS[order]
+    columns = [col(Item.id)] if column is None else [column, col(Item.id)]
+
+    if cursor is not None:
+        types: list[type] = [int] if column is None else [datetime, int]
+        after = decode_cursor(cursor, order.value, types)
+        # Row comparison, so that the composite index is used
+        key, value = tuple_(*columns), tuple_(*after)
+        query = query.where(key < value if descending else key > value)
+
+    return query.order_by(*(c.desc() if descending else c for c in columns))
+
+
+def _bounds_filter(
+    latitude_min: float | None,
+    latitude_max: float | None,
+    longitude_min: float | None,
+    longitude_max: float | None,
+):
+    """
+    Condition matching items within the given latitude / longitude ranges,
+    using the spatial index. Missing bounds are unrestricted. If
+    `longitude_min > longitude_max`, the range crosses the 180/-180 line and is
+    split into two envelopes.
+    """
+    if all(
+        bound is None
+        for bound in (latitude_min, latitude_max, longitude_min, longitude_max)
+    ):
+        return None
+
+    south = -90 if latitude_min is None else latitude_min
+    north = 90 if latitude_max is None else latitude_max
+    if south > north:
+        raise HTTPException(422, "latitude_min must not be greater than latitude_max")
+
+    west = -180 if longitude_min is None else longitude_min
+    east = 180 if longitude_max is None else longitude_max
+
+    def envelope(west: float, east: float):
+        return geofunc.ST_Intersects(
+            item_geometry, geofunc.ST_MakeEnvelope(west, south, east, north, 4326)
+        )
+
+    if west > east:
+        return or_(envelope(west, 180), envelope(-180, east))
+
+    return envelope(west, east)
+
+
 def _extract_bounding_boxes(item: ItemCreate) -> list[BoundingBoxRequest]:
     try:
         return [
@@ -159,151 +255,240 @@ async def create_item(
 
     saved_item = Item.model_validate(item)
     session.add(saved_item)
-    session.commit()
-    session.refresh(saved_item)
+    await record_activity(
+        session,
+        saved_item.user_id,
+        AchievementMetric.items_reported,
+        saved_item,
+        saved_item.uploaded_at,
+    )
+    await session.commit()
+    saved_item = await _reload_item(session, saved_item.id)
+    tile_cache.invalidate()
+
+    if image_key := image_storage.key_from_public_path(image_path):
+        schedule_derivatives(image_key)
+
     return saved_item.into_response()
 
 
 @router.post("/detection", response_model=list[BoundingBoxResponse])
 async def detect_items_on_photo(
     file: UploadFile,
+    response: Response,
 ):
     _validate_image_metadata(file)
 
-    contents = await file.read()
-
-    if len(contents) > settings.max_file_size:
-        raise HTTPException(
-            400,
-            f"File too large. Maximum file size is {settings.max_file_size} "
-            f"got {len(contents)}",
-        )
-
-    try:
-        image = Image.open(BytesIO(contents))
-        image.verify()
-    except Exception:
-        raise HTTPException(400, "Uploaded file is not a valid image.")
-
-    image = Image.open(BytesIO(contents))
-
-    result = await run_in_threadpool(get_bounding_boxes, image)
-    return result
-
-
-@router.get("/", response_model=list[ItemResponse])
-def search_items(  # noqa: C901
-    # fmt: off
-    session: SessionDep,
-
-    offset: int = Query(ge=0, default=0),
-    limit: int = Query(le=10000, default=100),
-
-    author_id: str | None = None,
-
-    created_before: datetime | None = None,
-    created_after: datetime | None = None,
+    timer = StageTimer()
 
-    uploaded_before: datetime | None = None,
-    uploaded_after: datetime | None = None,
+    with timer.stage("read"):
+        upload = await inspect_upload(file)
 
-    latitude_min: float | None = Query(ge=-90, le=90, default=None),
-    latitude_max: float | None = Query(ge=-90, le=90, default=None),
-
-    longitude_min: float | None = Query(ge=-180, le=180, default=None),
-    longitude_max: float | None = Query(ge=-180, le=180, default=None),
+    bounding_boxes = await get_bounding_boxes(
+        upload.sha256,
+        partial(decode_image, file.file, min_size=get_backend().input_size),
+        timer,
+    )
 
-    nearby_center_latitude: float | None = Query(ge=-90, le=90, default=None),
-    nearby_center_longitude: float | None = Query(ge=-180, le=180, default=None),
-    nearby_radius_meters: float | None = None,
+    response.headers["Server-Timing"] = timer.server_timing()
+    return bounding_boxes
 
-    contains_item_type: ItemType | None = None,
 
-    collected: bool | None = None,
-    collected_by: str | None = None,
-    collected_before: datetime | None = None,
-    collected_after: datetime | None = None,
-    # fmt: on
-):
-    query = select(Item)
+@router.get("/detection/stats", response_model=DetectionStats)
+def detection_stats():
+    """Model load and warm-up timings and batching metrics of this worker."""
+    return get_detection_stats()
 
-    if author_id:
-        query = query.where(Item.user_id == author_id)
 
-    if created_before:
-        query = query.where(Item.created_at < created_before)
-    if created_after:
-        query = query.where(Item.created_at > created_after)
+def _apply_filters(query, filters: ItemFilters):  # noqa: C901
+    if filters.author_id:
+        query = query.where(Item.user_id == filters.author_id)
 
-    if uploaded_before:
-        query = query.where(Item.uploaded_at < uploaded_before)
-    if uploaded_after:
-        query = query.where(Item.uploaded_at > uploaded_after)
+    if filters.created_before:
+        query = query.where(Item.created_at < filters.created_before)
+    if filters.created_after:
+        query = query.where(Item.created_at > filters.created_after)
 
-    if latitude_min is not None:
-        query = query.where(Item.latitude >= latitude_min)
-    if latitude_max is not None:
-        query = query.where(Item.latitude <= latitude_max)
+    if filters.uploaded_before:
+        query = query.where(Item.uploaded_at < filters.uploaded_before)
+    if filters.uploaded_after:
+        query = query.where(Item.uploaded_at > filters.uploaded_after)
 
-    if (
-        longitude_min is not None
-        and longitude_max is not None
-        and longitude_min > longitude_max
-    ):
-        # Special case: Longitude range crosses 180/-180 line
-        query = query.where(
-            or_(Item.longitude >= longitude_min, Item.longitude <= longitude_max)
-        )
-
-    else:
-        if longitude_min is not None:
-            query = query.where(Item.longitude >= longitude_min)
-        if longitude_max is not None:
-            query = query.where(Item.longitude <= longitude_max)
+    bounds = _bounds_filter(
+        filters.latitude_min,
+        filters.latitude_max,
+        filters.longitude_min,
+        filters.longitude_max,
+    )
+    if bounds is not None:
+        query = query.where(bounds)
 
     if (
-        nearby_center_latitude is not None
-        and nearby_center_longitude is not None
-        and nearby_radius_meters is not None
+        filters.nearby_center_latitude is not None
+        and filters.nearby_center_longitude is not None
+        and filters.nearby_radius_meters is not None
     ):
         center_point = (
-            f"SRID=4326;POINT({nearby_center_longitude} {nearby_center_latitude})"
+            f"SRID=4326;POINT({filters.nearby_center_longitude} "
+            f"{filters.nearby_center_latitude})"
         )
 
         query = query.where(
-            geofunc.ST_DWithin(Item.location, center_point, nearby_radius_meters)
+            geofunc.ST_DWithin(
+                Item.location, center_point, filters.nearby_radius_meters
+            )
         )
 
-    if contains_item_type:
-        query = (
-            query.join(BoundingBox, BoundingBox.item_id == Item.id)
-            .where(BoundingBox.item_type == contains_item_type)
-            .distinct()
+    if filters.contains_item_type:
+        # EXISTS rather than a join, so that rows are neither duplicated nor
+        # need DISTINCT, which also keeps aggregates correct
+        query = query.where(
+            Item.bounding_boxes.any(  # type: ignore
+                BoundingBox.item_type == filters.contains_item_type
+            )
         )
 
-    if collected is not None:
-        query = query.where(Item.collected == collected)
-    if collected_by:
-        query = query.where(Item.collected_by == collected_by)
-    if collected_before:
+    if filters.collected is not None:
+        query = query.where(Item.collected == filters.collected)
+    if filters.collected_by:
+        query = query.where(Item.collected_by == filters.collected_by)
+    if filters.collected_before:
         query = query.where(
             Item.collected_timestamp != None,  # noqa: E711
-            Item.collected_timestamp < collected_before,  # type: ignore
+            Item.collected_timestamp < filters.collected_before,  # type: ignore
         )
-    if collected_after:
+    if filters.collected_after:
         query = query.where(
             Item.collected_timestamp != None,  # noqa: E711
-            Item.collected_timestamp > collected_after,  # type: ignore
+            Item.collected_timestamp > filters.collected_after,  # type: ignore
         )
 
-    items = session.exec(query.offset(offset).limit(limit)).all()
+    return query
+
+
+@router.get("/", response_model=list[ItemResponse])
+async def search_items(
+    # fmt: off
+    session: SessionDep,
+    response: Response,
+    filters: Annotated[ItemFilters, Depends()],
+
+    # Pass the X-Next-Cursor header of a response as `cursor` to get the next
+    # page. It is absent on the last page. Prefer it over `offset`.
+    order: ItemOrder = ItemOrder.id,
+    cursor: str | None = None,
+    offset: int = Query(ge=0, default=0),
+    limit: int = Query(ge=1, le=10000, default=100),
+    # fmt: on
+):
+    query = select(Item).options(selectinload(Item.bounding_boxes))
+    query = _apply_filters(query, filters)
+    query = _apply_order(query, order, cursor)
+
+    # One extra row tells whether there is a next page
+    items = (await session.exec(query.offset(offset).limit(limit + 1))).all()
+    if len(items) > limit:
+        items = items[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            order.value, _sort_key(items[-1], order)
+        )
 
     return [item.into_response() for item in items]
 
 
+@router.get("/clusters", response_model=list[ItemClusterResponse])
+async def cluster_items(
+    session: SessionDep,
+    filters: Annotated[ItemFilters, Depends()],
+    zoom: int = Query(ge=0, le=22),
+    limit: int = Query(ge=1, le=10000, default=10000),
+):
+    """
+    Counts of items matching the filters, grouped into grid cells sized for
+    the map zoom level. Pass the viewport as the latitude / longitude bounds.
+    """
+    # About 64 px wide cells on a 256 px web map tile
+    cell_size = 360 / 2 ** (zoom + 2)
+    cell = geofunc.ST_SnapToGrid(item_geometry, cell_size)
+
+    query = select(
+        func.avg(Item.latitude),
+        func.avg(Item.longitude),
+        func.count(),
+        func.min(Item.id),
+    ).group_by(cell)
+    query = _apply_filters(query, filters)
+    query = query.order_by(func.count().desc()).limit(limit)
+
+    return [
+        ItemClusterResponse(
+            latitude=latitude,
+            longitude=longitude,
+            count=count,
+            item_id=item_id if count == 1 else None,
+        )
+        for latitude, longitude, count, item_id in (await session.exec(query)).all()
+    ]
+
+
+def _tile_query(z: int, x: int, y: int, filters: ItemFilters):
+    envelope = geofunc.ST_TileEnvelope(z, x, y)
+    item_types = (
+        select(func.string_agg(distinct(cast(BoundingBox.item_type, String)), ","))
+        .where(BoundingBox.item_id == Item.id)
+        .scalar_subquery()
+    )
+
+    features = select(
+        Item.id,
+        Item.collected,
+        item_types.label("item_types"),  # Comma separated, MVT has no lists
+        geofunc.ST_AsMVTGeom(
+            geofunc.ST_Transform(item_geometry, 3857), envelope, TILE_EXTENT
+        ).label("geom"),
+    ).where(geofunc.ST_Intersects(item_geometry, geofunc.ST_Transform(envelope, 4326)))
+    features = _apply_filters(features, filters)
+    features = (
+        features.order_by(Item.id.desc())  # type: ignore
+        .limit(settings.tile_max_features)
+        .subquery("features")
+    )
+
+    return select(
+        geofunc.ST_AsMVT(features.table_valued(), "items", TILE_EXTENT, "geom")
+    )
+
+
+@router.get("/tiles/{z}/{x}/{y}.mvt", response_class=Response)
+async def get_tile(
+    session: SessionDep,
+    filters: Annotated[ItemFilters, Depends()],
+    z: int,
+    x: int,
+    y: int,
+):
+    """
+    Mapbox Vector Tile of matching items, in the `items` layer. Features have
+    `id`, `collected` and `item_types` properties.
+    """
+    if not (0 <= z <= 22 and 0 <= x < 2**z and 0 <= y < 2**z):
+        raise HTTPException(404, "Tile out of range")
+
+    key = tile_cache.key(z, x, y, astuple(filters))
+    tile = tile_cache.get(key)
+    if tile is None:
+        result = await session.exec(_tile_query(z, x, y, filters))
+        tile = bytes(result.one()[0] or b"")
+        tile_cache.set(key, tile)
+
+    return Response(
+        tile, media_type=TILE_MEDIA_TYPE, headers={"Cache-Control": "max-age=60"}
+    )
+
+
 @router.get("/{item_id}", response_model=ItemResponse)
-def get_item(item_id: int, session: SessionDep):
-    item = session.get(Item, item_id)
+async def get_item(item_id: int, session: SessionDep):
+    item = await _get_item(session, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="No item with given id found")
 
@@ -311,12 +496,13 @@ def get_item(item_id: int, session: SessionDep):
 
 
 @router.post("/{item_id}/collect", response_model=ItemResponse)
-def mark_as_collected(
+async def mark_as_collected(
     session: SessionDep,
     item_id: int,
     user_id: str = Security(auth, scopes=["collect:items"]),
 ):
-    item = session.get(Item, item_id)
+    # Locked, so that concurrent requests cannot both collect the item
+    item = await _get_item(session, item_id, lock=True)
     if not item:
         raise HTTPException(status_code=404, detail="No item with given id found")
 
@@ -327,24 +513,32 @@ def mark_as_collected(
     item.collected_by = user_id
     item.collected_timestamp = datetime.now()
 
-    session.commit()
-    session.refresh(item)
+    await record_activity(
+        session,
+        user_id,
+        AchievementMetric.items_collected,
+        item,
+        item.collected_timestamp,
+    )
+    await session.commit()
+    item = await _reload_item(session, item_id)
+    tile_cache.invalidate()
 
     return item.into_response()
 
 
 @router.post("/{item_id}/messages", response_model=MessageResponse)
-def post_message(
+async def post_message(
     session: SessionDep,
     message: MessageRequest,
     item_id: int,
     user_id: str = Security(auth),
 ):
-    item = session.get(Item, item_id)
+    item = await session.get(Item, item_id)
     if not item:
         raise HTTPException(404, "Item not found")
 
-    user = ensure_user(user_id, session)
+    user = await ensure_user(user_id, session)
 
     message = Message(
         **message.model_dump(),
@@ -357,20 +551,23 @@ def post_message(
 
     saved_message = Message.model_validate(message)
     session.add(saved_message)
-    session.commit()
-    session.refresh(saved_message)
+    await session.commit()
+    await session.refresh(saved_message)
 
     return saved_message.into_response()
 
 
 @router.get("/{item_id}/messages", response_model=list[MessageResponse])
-def get_messages(
+async def get_messages(
     session: SessionDep,
     item_id: int,
     user_id: str = Security(auth),
 ):
-    item = session.get(Item, item_id)
+    item = await session.get(Item, item_id)
     if not item:
         raise HTTPException(404, "Item not found")
 
-    return [msg.into_response() for msg in item.messages]
+    messages = await session.exec(
+        select(Message).where(Message.item_id == item_id).order_by(Message.id)
+    )
+    return [msg.into_response() for msg in messages.all()]
@@ -1,23 +1,26 @@
+from datetime import datetime
+
 from fastapi import APIRouter, HTTPException, Security
+from sqlalchemy import and_
+from sqlalchemy.dialects.postgresql import insert
 from sqlmodel import select
 
-from core.auth import VerifyUserID
+from core.auth import auth
 from core.db import SessionDep
 from core.models.achievement import (
     Achievement,
     AchievementUserLink,
     UserAchievementResponse,
 )
-from core.models.user import User, UserResponse, ensure_user
+from core.models.stats import UserItemTypeStats, UserStats, UserStatsResponse
+from core.models.user import User, UserResponse
 from core.utils import validate_user_id
 
-auth = VerifyUserID()
-
 router = APIRouter(prefix="/users")
 
 
 @router.post("/{user_id}/register", response_model=UserResponse, deprecated=True)
-def register_user(
+async def register_user(
     user_id: str,
     session: SessionDep,
     auth_user_id: str = Security(auth),
@@ -30,106 +33,76 @@ def register_user(
 
     validate_user_id(auth_user_id, user_id)
 
-    if user := session.get(User, user_id):
+    if user := await session.get(User, user_id):
         return user.into_response()
 
     user = User(id=user_id)
     saved_user = User.model_validate(user)
     session.add(saved_user)
-    session.commit()
-    session.refresh(saved_user)
+    await session.commit()
+    await session.refresh(saved_user)
     return saved_user.into_response()
 
 
+def _user_achievements(user_id: str):
+    """All achievements, with `unlocked_at` set for those the user unlocked."""
+    return select(Achievement, AchievementUserLink.unlocked_at).outerjoin(
+        AchievementUserLink,
+        and_(
+            AchievementUserLink.achievement_id == Achievement.id,
+            AchievementUserLink.user_id == user_id,
+        ),
+    )
+
+
+def _into_response(
+    achievement: Achievement, unlocked_at: datetime | None
+) -> UserAchievementResponse:
+    return UserAchievementResponse(
+        **achievement.model_dump(),
+        unlocked=unlocked_at is not None,
+        unlocked_at=unlocked_at,
+    )
+
+
 @router.get("/{user_id}/achievements", response_model=list[UserAchievementResponse])
-def list_user_achievements(
+async def list_user_achievements(
     user_id: str,
     session: SessionDep,
     only_unlocked: bool = True,
 ):
-    user = session.get(User, user_id)
-
-    if not user:
-        return []
+    query = _user_achievements(user_id).order_by(Achievement.id)
 
     if only_unlocked:
-        result = []
-        for achievement in user.achievements:
-            link = session.exec(
-                select(AchievementUserLink).where(
-                    AchievementUserLink.user_id == user.id,
-                    AchievementUserLink.achievement_id == achievement.id,
-                )
-            ).first()
-            result.append(
-                UserAchievementResponse(
-                    **achievement.model_dump(),
-                    unlocked=True,
-                    unlocked_at=link.unlocked_at if link else None,
-                )
-            )
-        return result
-    else:
-        all_achievements = session.exec(select(Achievement)).all()
-        result = []
-        for achievement in all_achievements:
-            if achievement in user.achievements:
-                link = session.exec(
-                    select(AchievementUserLink).where(
-                        AchievementUserLink.user_id == user.id,
-                        AchievementUserLink.achievement_id == achievement.id,
-                    )
-                ).first()
-                unlocked = True
-                unlocked_at = link.unlocked_at if link else None
-            else:
-                unlocked = False
-                unlocked_at = None
-
-            result.append(
-                UserAchievementResponse(
-                    **achievement.model_dump(),
-                    unlocked=unlocked,
-                    unlocked_at=unlocked_at,
-                )
-            )
-        return result
+        query = query.where(AchievementUserLink.unlocked_at != None)  # noqa: E711
+
+    rows = await session.exec(query)
+    return [
+        _into_response(achievement, unlocked_at) for achievement, unlocked_at in rows
+    ]
 
 
 @router.get(
     "/{user_id}/achievements/{achievement_id}", response_model=UserAchievementResponse
 )
-def get_user_achievement(user_id: str, achievement_id: int, session: SessionDep):
-    user = session.get(User, user_id)
-    achievement = session.get(Achievement, achievement_id)
+async def get_user_achievement(user_id: str, achievement_id: int, session: SessionDep):
+    row = (
+        await session.exec(
+            _user_achievements(user_id).where(Achievement.id == achievement_id)
+        )
+    ).first()
 
-    if not achievement:
+    if not row:
         raise HTTPException(status_code=404, detail="Achievement not found")
 
-    unlocked = user is not None and achievement in user.achievements
-    unlocked_at = None
-
-    if unlocked:
-        link = session.exec(
-            select(AchievementUserLink).where(
-                AchievementUserLink.user_id == user.id,
-                AchievementUserLink.achievement_id == achievement.id,
-            )
-        ).first()
-        unlocked_at = link.unlocked_at if link else None
-
-    return UserAchievementResponse(
-        **achievement.model_dump(),
-        unlocked=unlocked,
-        unlocked_at=unlocked_at,
-    )
+    return _into_response(*row)
 
 
 @router.post(
     "/{user_id}/achievements/{achievement_id}/unlock",
     response_model=UserAchievementResponse,
 )
-def unlock_achievement(
+async def unlock_achievement(
     user_id: str,
     achievement_id: int,
     session: SessionDep,
@@ -137,28 +110,49 @@ def unlock_achievement(
 ):
     validate_user_id(auth_user_id, user_id)
 
-    user = ensure_user(user_id, session)
-
-    achievement = session.get(Achievement, achievement_id)
+    query = _user_achievements(user_id).where(Achievement.id == achievement_id)
+    row = (await session.exec(query)).first()
 
-    if not achievement:
+    if not row:
         raise HTTPException(status_code=404, detail="Achievement not found")
 
-    if achievement not in user.achievements:
-        user.achievements.append(achievement)
-        session.commit()
-        session.refresh(achievement)
-        session.refresh(user)
-
-    link = session.exec(
-        select(AchievementUserLink).where(
-            AchievementUserLink.user_id == user.id,
-            AchievementUserLink.achievement_id == achievement.id,
+    achievement, unlocked_at = row
+    if achievement.rule_metric is not None:
+        raise HTTPException(
+            status_code=403,
+            detail="Achievement is unlocked automatically and cannot be unlocked",
         )
-    ).first()
 
-    return UserAchievementResponse(
-        **achievement.model_dump(),
-        unlocked=True,
-        unlocked_at=link.unlocked_at if link else None,
+    if unlocked_at is None:
+        await session.exec(insert(User).values(id=user_id).on_conflict_do_nothing())
+        unlocked_at = (
+            await session.exec(
+                insert(AchievementUserLink)
+                .values(achievement_id=achievement_id, user_id=user_id)
+                .on_conflict_do_nothing()
+                .returning(AchievementUserLink.unlocked_at)
+            )
+        ).scalar_one_or_none()
+        await session.commit()
+
+        if unlocked_at is None:
+            # Unlocked concurrently by another request
+            achievement, unlocked_at = (await session.exec(query)).one()
+
+    return _into_response(achievement, unlocked_at)
+
+
+@router.get("/{user_id}/stats", response_model=UserStatsResponse)
+async def get_user_stats(user_id: str, session: SessionDep):
+    """Items reported and collected by the user, in total and by type."""
+    stats = await session.get(UserStats, user_id) or UserStats(user_id=user_id)
+    item_types = await session.exec(
+        select(UserItemTypeStats)
+        .where(UserItemTypeStats.user_id == user_id)
+        .order_by(UserItemTypeStats.item_type)
+    )
+
+    return UserStatsResponse(
+        **stats.model_dump(),
+        item_types=[stats.into_response() for stats in item_types.all()],
     )
@@ -0,0 +1,109 @@
+import asyncio
+import re
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+
+from api.caching import not_modified
+from core.config import settings
+from core.derivatives import schedule_derivatives
+from core.image_paths import IMAGE_ROOT, VARIANTS, derivative_key, source_key
+
+router = APIRouter(prefix="/image")
+
+# Content-addressed images never change, so clients may cache them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+
+def _resolve(image_key: str) -> Path:
+    """Path of a stored image. Rejects paths outside the image directory."""
+    path = (IMAGE_ROOT / image_key).resolve()
+    if (
+        not path.is_relative_to(IMAGE_ROOT.resolve())
+        or any(part.startswith(".") for part in Path(image_key).parts)
+        or not path.is_file()
+    ):
+        raise HTTPException(404, "Image not found")
+    return path
+
+
+def _etag(image_key: str, path: Path) -> tuple[str, bool]:
+    """
+    Returns the ETag of an image and whether the image is immutable.
+
+    Images (and their variants) stored under their SHA-256 get a strong ETag
+    from the hash. Images stored before that use the file's mtime and size.
+    """
+    sha256 = path.name.split(".", 1)[0]
+    if _SHA256.fullmatch(sha256):
+        if image_key.startswith("derivatives/"):
+            variant = image_key.split("/")[1]
+            return f'"{sha256}-{variant}"', True
+        return f'"{sha256}"', True
+
+    stat = path.stat()
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', False
+
+
+def serve_image(request: Request, image_key: str, media_type: str | None = None):
+    """
+    Responds with a stored image, honouring If-None-Match.
+
+    If `image_accel_redirect_prefix` is set, the file itself is sent by nginx
+    through X-Accel-Redirect. Otherwise it is sent from here, using sendfile
+    where the server supports it. Range requests are supported either way.
+    """
+    path = _resolve(image_key)
+    etag, immutable = _etag(image_key, path)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else "no-cache",
+    }
+
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if settings.image_accel_redirect_prefix:
+        relative = path.relative_to(IMAGE_ROOT.resolve()).as_posix()
+        headers["X-Accel-Redirect"] = (
+            f"{settings.image_accel_redirect_prefix.rstrip('/')}/{relative}"
+        )
+        return Response(headers=headers, media_type=media_type)
+
+    # FileResponse only sets its own ETag if none is given
+    return FileResponse(path, headers=headers, media_type=media_type)
+
+
+@router.get("/derivatives/{variant}/{image_key:path}", response_class=FileResponse)
+async def get_derivative(request: Request, variant: str, image_key: str):
+    """
+    Serves a resized variant of an image, generating it first if needed
+    (e.g. for images uploaded before variants existed).
+    """
+    if variant not in VARIANTS:
+        raise HTTPException(404, "Unknown image variant")
+
+    source = source_key(image_key)
+    key = derivative_key(source, variant)
+
+    if not (IMAGE_ROOT / key).is_file():
+        _resolve(source)
+        job = schedule_derivatives(source)
+        if job is None:
+            raise HTTPException(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "Image variant queue is full. Please try again later.",
+            )
+        try:
+            await asyncio.wrap_future(job)
+        except Exception:
+            raise HTTPException(500, "Could not generate image variant")
+
+    return serve_image(request, key, media_type="image/webp")
+
+
+@router.get("/{image_key:path}", response_class=FileResponse)
+def get_image(request: Request, image_key: str):
+    return serve_image(request, image_key)
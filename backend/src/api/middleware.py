@@ -0,0 +1,51 @@
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Room for the other form fields and the multipart framing of an upload
+FORM_OVERHEAD = 1024 * 1024  # 1 MB
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects requests with a body larger than `max_size` bytes with 413, before
+    the body is parsed (and multipart uploads spooled to disk).
+
+    The declared Content-Length is checked up front. Chunked bodies, which have
+    none, are cut off as soon as more than `max_size` bytes were received.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int):
+        self._app = app
+        self._max_size = max_size
+        self._detail = f"Request body too large. Maximum size is {max_size} bytes"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self._max_size:
+            response = JSONResponse(
+                {"detail": self._detail},
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_limited() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self._max_size:
+                    raise HTTPException(
+                        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, self._detail
+                    )
+            return message
+
+        await self._app(scope, receive_limited, send)
@@ -0,0 +1,68 @@
+"""
+Latency and throughput of the detection backends: eager YOLO (ultralytics) and
+YOLO on ONNX Runtime, in fp32 and int8.
+
+Usage (from backend/src, with the backend environment variables set and the
+YOLO weights in place):
+
+    python -m benchmarks.detection --batch-size 8 --runs 50
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable
+
+from PIL import Image
+
+from core.config import settings
+from core.detection import onnx_yolo, yolo
+from core.detection.detection import Detections
+from core.detection.registry import registry
+
+Detect = Callable[[list[Image.Image]], list[Detections]]
+
+
+def _time(detect: Detect, images: list[Image.Image], runs: int) -> list[float]:
+    detect(images)  # Loads (and for ONNX, exports) the model
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        detect(images)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _report(name: str, detect: Detect, image: Image.Image, args: argparse.Namespace):
+    latencies = _time(detect, [image], args.runs)
+    batches = _time(detect, [image] * args.batch_size, args.runs)
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    throughput = args.batch_size * len(batches) / sum(batches)
+    print(
+        f"{name:12} latency p50 {statistics.median(latencies) * 1000:7.1f} ms, "
+        f"p99 {p99 * 1000:7.1f} ms, "
+        f"throughput {throughput:6.1f} images/s (batches of {args.batch_size})"
+    )
+
+
+def _main(args: argparse.Namespace):
+    image = Image.open(args.image).convert("RGB")
+
+    _report("yolo", yolo.detect, image, args)
+
+    for quantize, name in [(False, "onnx fp32"), (True, "onnx int8")]:
+        settings.onnx_quantize = quantize
+        registry.unload("onnx")
+        _report(name, onnx_yolo.detect, image, args)
+
+
+if __name__ == "__main__":
+    from ultralytics.utils import ASSETS  # type: ignore
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--image", default=ASSETS / "bus.jpg")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=50)
+    _main(parser.parse_args())
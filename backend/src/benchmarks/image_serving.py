@@ -0,0 +1,83 @@
+"""
+Backend cost of serving a stored image, in the ways the app can answer:
+
+- staticfiles: the `StaticFiles` mount used before the images router
+- app: the router sending the file itself
+- not modified: the router answering If-None-Match with 304
+- x-accel: the router handing the file to nginx (`image_accel_redirect_prefix`)
+
+The app is called in-process, so the numbers are the work a backend worker does
+per request, not image fetch throughput. In particular, the X-Accel-Redirect
+response has no body: nginx sends the file afterwards, which is not measured.
+For end-to-end numbers, run `benchmarks.load` against the compose stack (nginx
+on port 80, proxying /image/ to the backend) with the setting unset and set:
+
+    python -m benchmarks.load http://localhost/image/<key> --concurrency 32
+
+Usage (from backend/src, with the backend environment variables set):
+
+    python -m benchmarks.image_serving --size-kb 2048 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
+
+from api import images
+from benchmarks.load import run_load
+from core.config import settings
+
+
+async def _benchmark(
+    app: FastAPI,
+    url: str,
+    args: argparse.Namespace,
+    headers: dict[str, str] | None = None,
+) -> str:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://app", headers=headers
+    ) as client:
+        await run_load(client, [url], args.concurrency, args.concurrency * 2)
+        result = await run_load(client, [url], args.concurrency, args.requests)
+    return result.summary()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as root:
+        images.IMAGE_ROOT = Path(root)
+        image_key = f"{'0' * 64}.jpg"
+        (Path(root) / image_key).write_bytes(os.urandom(args.size_kb * 1024))
+        url = f"/image/{image_key}"
+
+        static_app = FastAPI()
+        static_app.mount("/image", StaticFiles(directory=root), name="image")
+        print(f"staticfiles:   {await _benchmark(static_app, url, args)}")
+
+        app = FastAPI()
+        app.include_router(images.router)
+
+        settings.image_accel_redirect_prefix = None
+        print(f"app:           {await _benchmark(app, url, args)}")
+
+        etag = {"If-None-Match": f'"{"0" * 64}"'}
+        print(f"not modified:  {await _benchmark(app, url, args, etag)}")
+
+        settings.image_accel_redirect_prefix = "/protected-image"
+        print(f"x-accel:       {await _benchmark(app, url, args)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--size-kb", type=int, default=1024)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(_main(parser.parse_args()))
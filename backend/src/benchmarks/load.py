@@ -0,0 +1,102 @@
+"""
+HTTP load generator reporting throughput and latency percentiles.
+
+Usage (from backend/src):
+
+    python -m benchmarks.load http://localhost:9090/api/v1/items \
+        --concurrency 64 --requests 5000 --header "Authorization: Bearer <token>"
+
+Run it against two deployments (e.g. before and after a change) to compare them.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from dataclasses import dataclass
+
+import httpx
+
+
+@dataclass
+class LoadResult:
+    requests: int
+    errors: int
+    seconds: float
+    latencies: list[float]  # Seconds, of successful requests
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.seconds
+
+    def percentile(self, p: int) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else float("nan")
+        return statistics.quantiles(self.latencies, n=100)[p - 1]
+
+    def summary(self) -> str:
+        return (
+            f"{self.requests_per_second:8.1f} req/s, "
+            f"p50 {self.percentile(50) * 1000:7.2f} ms, "
+            f"p99 {self.percentile(99) * 1000:7.2f} ms, "
+            f"{self.errors} errors"
+        )
+
+
+async def run_load(
+    client: httpx.AsyncClient, urls: list[str], concurrency: int, requests: int
+) -> LoadResult:
+    """Sends `requests` GET requests to `urls` in turn, `concurrency` at a time."""
+    latencies: list[float] = []
+    errors = 0
+    next_request = 0
+
+    async def worker() -> None:
+        nonlocal errors, next_request
+        while next_request < requests:
+            url = urls[next_request % len(urls)]
+            next_request += 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                await response.aread()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            if response.status_code >= 400:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return LoadResult(requests, errors, time.perf_counter() - start, latencies)
+
+
+def _parse_header(header: str) -> tuple[str, str]:
+    name, _, value = header.partition(":")
+    return name.strip(), value.strip()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    headers = dict(_parse_header(header) for header in args.header)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        headers=headers, limits=limits, timeout=args.timeout
+    ) as client:
+        # Warm up connections, caches and the server's lazily loaded state
+        await run_load(client, args.urls, args.concurrency, args.concurrency * 2)
+        result = await run_load(client, args.urls, args.concurrency, args.requests)
+    print(result.summary())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("urls", nargs="+", help="Requested in turn")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--header", action="append", default=[])
+    parser.add_argument("--timeout", type=float, default=60, help="In seconds")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,120 @@
+"""
+Micro-benchmark of non-maximum suppression: torchvision, the NumPy fallback
+and the per-pair Python loop that YOLO post-processing used before. The loop
+is skipped above `--previous-max-size` boxes, where it takes minutes per run.
+
+Usage (from backend/src):
+
+    python -m benchmarks.nms --sizes 10 100 300 1000 5000
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import numpy as np
+import torch
+
+from core.detection import nms
+
+NMS = Callable[[torch.Tensor, torch.Tensor, float], torch.Tensor]
+
+
+def _previous_iou(box1, box2):
+    x1 = max(box1[0], box2[0])
+    y1 = max(box1[1], box2[1])
+    x2 = min(box1[2], box2[2])
+    y2 = min(box1[3], box2[3])
+
+    inter_area = max(0, x2 - x1) * max(0, y2 - y1)
+    box1_area = (box1[2] - box1[0]) * (box1[3] - box1[1])
+    box2_area = (box2[2] - box2[0]) * (box2[3] - box2[1])
+    union_area = box1_area + box2_area - inter_area
+
+    return inter_area / union_area if union_area != 0 else 0
+
+
+def _previous_nms(boxes: torch.Tensor, scores: torch.Tensor, iou_threshold: float):
+    """The implementation replaced by `core.detection.nms`, for comparison."""
+    indices = scores.argsort(descending=True)
+    keep = []
+
+    while indices.numel() > 0:
+        current = indices[0]
+        keep.append(current.item())
+        if indices.numel() == 1:
+            break
+
+        current_box = boxes[current]
+        rest_boxes = boxes[indices[1:]]
+        ious = torch.tensor([_previous_iou(current_box, box) for box in rest_boxes])
+        indices = indices[1:][ious <= iou_threshold]
+
+    return torch.tensor(keep, dtype=torch.long)
+
+
+def _numpy_nms(boxes: torch.Tensor, scores: torch.Tensor, iou_threshold: float):
+    keep = nms._nms_numpy(
+        boxes.double().numpy(), scores.double().numpy(), iou_threshold
+    )
+    return torch.from_numpy(keep)
+
+
+def _random_boxes(count: int, rng: np.random.Generator):
+    """Boxes in a 640x640 image, clustered so that many of them overlap."""
+    centers = rng.uniform(0, 640, (max(1, count // 10), 2))
+    xy = centers[rng.integers(len(centers), size=count)] + rng.normal(0, 8, (count, 2))
+    sizes = rng.uniform(20, 120, (count, 2))
+    boxes = np.concatenate([xy - sizes / 2, xy + sizes / 2], axis=1)
+    return torch.from_numpy(boxes).float(), torch.from_numpy(rng.random(count)).float()
+
+
+def _time(implementation: NMS, boxes, scores, iou_threshold: float) -> float:
+    runs = 0
+    start = time.perf_counter()
+    # At least 5 runs and 0.2 s, for stable timings of fast implementations
+    while runs < 5 or time.perf_counter() - start < 0.2:
+        implementation(boxes, scores, iou_threshold)
+        runs += 1
+    return (time.perf_counter() - start) / runs
+
+
+def _main(args: argparse.Namespace) -> None:
+    implementations: dict[str, NMS] = {"numpy": _numpy_nms, "previous": _previous_nms}
+    if nms._torchvision_nms is not None:
+        implementations = {"torchvision": nms._torchvision_nms, **implementations}
+
+    rng = np.random.default_rng(0)
+    print(f"{'boxes':>6} " + " ".join(f"{name:>14}" for name in implementations))
+
+    for size in args.sizes:
+        boxes, scores = _random_boxes(size, rng)
+        expected = _numpy_nms(boxes, scores, args.iou_threshold)
+        timings = []
+
+        for name, implementation in implementations.items():
+            # The previous loop takes minutes per run on thousands of boxes
+            if name == "previous" and size > args.previous_max_size:
+                timings.append("skipped")
+                continue
+
+            kept = implementation(boxes, scores, args.iou_threshold)
+            if not torch.equal(kept.long(), expected):
+                raise AssertionError(f"{name} keeps different boxes")
+            duration = _time(implementation, boxes, scores, args.iou_threshold)
+            timings.append(f"{duration * 1000:.3f} ms")
+
+        print(f"{size:>6} " + " ".join(f"{t:>14}" for t in timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 100, 300, 1000, 5000]
+    )
+    parser.add_argument("--previous-max-size", type=int, default=1000)
+    # 0.95 is used after YOLO, 0.7 is the per-class ultralytics default
+    parser.add_argument("--iou-threshold", type=float, default=0.7)
+    _main(parser.parse_args())
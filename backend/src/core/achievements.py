@@ -0,0 +1,232 @@
+"""
+Per-user statistics and the achievement rules evaluated from them.
+
+The counters in `UserStats` and `UserItemTypeStats` are updated in the same
+transaction as the item change they count. After each update, only the
+achievements whose rule depends on a changed counter are checked.
+"""
+
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import and_, delete, func, literal, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.models.achievement import Achievement, AchievementUserLink
+from core.models.enums import AchievementMetric
+from core.models.item import BoundingBox, Item, ItemType
+from core.models.stats import UserItemTypeStats, UserStats
+from core.models.user import User
+
+
+async def _increment(
+    session: AsyncSession,
+    user_id: str,
+    metric: AchievementMetric,
+    item_types: set[ItemType],
+    at: datetime,
+) -> tuple[int, dict[ItemType, int]]:
+    """Adds one to the user's `metric` counters, returns their new values."""
+    column = metric.value
+
+    upsert = insert(UserStats).values(
+        user_id=user_id, first_activity_at=at, last_activity_at=at, **{column: 1}
+    )
+    total = (
+        await session.exec(
+            upsert.on_conflict_do_update(
+                index_elements=[UserStats.user_id],
+                set_={
+                    column: getattr(UserStats, column) + 1,
+                    "first_activity_at": func.coalesce(UserStats.first_activity_at, at),
+                    "last_activity_at": func.greatest(UserStats.last_activity_at, at),
+                },
+            ).returning(getattr(UserStats, column))
+        )
+    ).scalar_one()
+
+    per_type = {}
+    for item_type in item_types:
+        upsert = insert(UserItemTypeStats).values(
+            user_id=user_id, item_type=item_type, **{column: 1}
+        )
+        per_type[item_type] = (
+            await session.exec(
+                upsert.on_conflict_do_update(
+                    index_elements=[
+                        UserItemTypeStats.user_id,
+                        UserItemTypeStats.item_type,
+                    ],
+                    set_={column: getattr(UserItemTypeStats, column) + 1},
+                ).returning(getattr(UserItemTypeStats, column))
+            )
+        ).scalar_one()
+
+    return total, per_type
+
+
+async def _unlock_reached(
+    session: AsyncSession,
+    user_id: str,
+    metric: AchievementMetric,
+    total: int,
+    per_type: dict[ItemType, int],
+) -> None:
+    """Unlocks achievements whose `metric` rule the new counters satisfy."""
+    reached = [
+        and_(
+            Achievement.rule_item_type == None,  # noqa: E711
+            col(Achievement.rule_threshold) <= total,
+        )
+    ] + [
+        and_(
+            Achievement.rule_item_type == item_type,
+            col(Achievement.rule_threshold) <= n,
+        )
+        for item_type, n in per_type.items()
+    ]
+    achievement_ids = select(Achievement.id, literal(user_id)).where(
+        Achievement.rule_metric == metric, or_(*reached)
+    )
+
+    # The user may not have a row yet, as users are created lazily
+    await session.exec(insert(User).values(id=user_id).on_conflict_do_nothing())
+    await session.exec(
+        insert(AchievementUserLink)
+        .from_select(["achievement_id", "user_id"], achievement_ids)
+        .on_conflict_do_nothing()
+    )
+
+
+async def record_activity(
+    session: AsyncSession,
+    user_id: str,
+    metric: AchievementMetric,
+    item: Item,
+    at: datetime,
+) -> None:
+    """
+    Counts `item` as reported / collected by the user and unlocks achievements
+    reached by it. Must be committed together with the item change.
+    """
+    item_types = {bb.item_type for bb in item.bounding_boxes}
+    total, per_type = await _increment(session, user_id, metric, item_types, at)
+    await _unlock_reached(session, user_id, metric, total, per_type)
+
+
+async def rebuild_stats(session: AsyncSession) -> None:
+    """
+    Recomputes all statistics from the items and unlocks every achievement
+    they satisfy, e.g. to backfill them. Achievements are never locked again.
+    Items created or collected while this runs may be miscounted.
+    """
+    await session.exec(delete(UserItemTypeStats))
+    await session.exec(delete(UserStats))
+
+    metrics = {
+        AchievementMetric.items_reported: (Item.user_id, Item.uploaded_at),
+        AchievementMetric.items_collected: (
+            Item.collected_by,
+            Item.collected_timestamp,
+        ),
+    }
+
+    for metric, (user_column, time_column) in metrics.items():
+        column = metric.value
+        per_user = (
+            select(
+                user_column, func.count(), func.min(time_column), func.max(time_column)
+            )
+            .where(user_column != None)  # noqa: E711
+            .group_by(user_column)
+        )
+        await session.exec(
+            insert(UserStats)
+            .from_select(
+                ["user_id", column, "first_activity_at", "last_activity_at"], per_user
+            )
+            .on_conflict_do_update(
+                index_elements=[UserStats.user_id],
+                set_={
+                    column: getattr(insert(UserStats).excluded, column),
+                    "first_activity_at": func.least(
+                        UserStats.first_activity_at,
+                        insert(UserStats).excluded.first_activity_at,
+                    ),
+                    "last_activity_at": func.greatest(
+                        UserStats.last_activity_at,
+                        insert(UserStats).excluded.last_activity_at,
+                    ),
+                },
+            )
+        )
+
+        per_type = (
+            select(
+                user_column,
+                BoundingBox.item_type,
+                func.count(func.distinct(Item.id)),
+            )
+            .join(BoundingBox, BoundingBox.item_id == Item.id)
+            .where(user_column != None)  # noqa: E711
+            .group_by(user_column, BoundingBox.item_type)
+        )
+        await session.exec(
+            insert(UserItemTypeStats)
+            .from_select(["user_id", "item_type", column], per_type)
+            .on_conflict_do_update(
+                index_elements=[UserItemTypeStats.user_id, UserItemTypeStats.item_type],
+                set_={column: getattr(insert(UserItemTypeStats).excluded, column)},
+            )
+        )
+
+    await _unlock_all_reached(session)
+
+
+async def _unlock_all_reached(session: AsyncSession) -> None:
+    for metric in AchievementMetric:
+        column = metric.value
+        totals = select(Achievement.id, UserStats.user_id).join(
+            UserStats,
+            and_(
+                Achievement.rule_item_type == None,  # noqa: E711
+                Achievement.rule_threshold <= getattr(UserStats, column),
+            ),
+        )
+        per_type = select(Achievement.id, UserItemTypeStats.user_id).join(
+            UserItemTypeStats,
+            and_(
+                Achievement.rule_item_type == UserItemTypeStats.item_type,
+                Achievement.rule_threshold <= getattr(UserItemTypeStats, column),
+            ),
+        )
+
+        for reached in (totals, per_type):
+            reached = reached.where(Achievement.rule_metric == metric)
+            user_ids = select(reached.subquery().c.user_id).distinct()
+            await session.exec(
+                insert(User).from_select(["id"], user_ids).on_conflict_do_nothing()
+            )
+            await session.exec(
+                insert(AchievementUserLink)
+                .from_select(["achievement_id", "user_id"], reached)
+                .on_conflict_do_nothing()
+            )
+
+
+async def _main():
+    from core.db import engine, session_factory, setup_db
+
+    await setup_db()
+    async with session_factory() as session:
+        await rebuild_stats(session)
+        await session.commit()
+    await engine.dispose()
+
+    print("Rebuilt user statistics")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
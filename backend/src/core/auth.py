@@ -1,14 +1,22 @@
 # Based on official examples from Auth0
 # https://github.com/auth0-blog/auth0-python-fastapi-sample/blob/main/application/utils.py
 
-from typing import Optional
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Optional
 
 import jwt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, SecurityScopes
 
+from core.cache import LRUCache
 from core.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 class UnauthorizedException(HTTPException):
     def __init__(self, detail: str, **kwargs):
@@ -23,19 +31,87 @@ class UnauthenticatedException(HTTPException):
         )
 
 
+class JWKSCache:
+    """
+    Signing keys fetched from a JWKS URL.
+
+    Once the keys are older than `refresh_seconds`, they are refetched in the
+    background while the old ones stay in use. A token signed with an unknown
+    key triggers an immediate refetch, so that rotated keys are picked up.
+    Fetches start at most once per `min_refetch_seconds` and concurrent
+    requests share a single fetch.
+    """
+
+    def __init__(self, url: str, refresh_seconds: float, min_refetch_seconds: float):
+        self._client = jwt.PyJWKClient(url, cache_jwk_set=False)
+        self._refresh_seconds = refresh_seconds
+        self._min_refetch_seconds = min_refetch_seconds
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._fetch_started_at = -float("inf")
+        self._fetch: asyncio.Task | None = None
+
+    async def get_signing_key(self, kid: str | None) -> jwt.PyJWK:
+        age = time.monotonic() - self._fetch_started_at
+
+        if kid in self._keys:
+            if age > self._refresh_seconds:
+                self._start_fetch()
+            return self._keys[kid]
+
+        if self._fetch is not None and not self._fetch.done():
+            await asyncio.shield(self._fetch)
+        elif age > self._min_refetch_seconds:
+            await asyncio.shield(self._start_fetch())
+
+        if kid not in self._keys:
+            raise jwt.exceptions.PyJWKClientError(
+                f'Unable to find a signing key that matches: "{kid}"'
+            )
+        return self._keys[kid]
+
+    def _start_fetch(self) -> asyncio.Task:
+        if self._fetch is None or self._fetch.done():
+            self._fetch_started_at = time.monotonic()
+            self._fetch = asyncio.create_task(self._fetch_keys())
+            self._fetch.add_done_callback(self._log_failure)
+        return self._fetch
+
+    async def _fetch_keys(self) -> None:
+        data = await run_in_threadpool(self._client.fetch_data)
+        key_set = jwt.PyJWKSet.from_dict(data)
+        self._keys = {key.key_id: key for key in key_set.keys if key.key_id}
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and (error := task.exception()) is not None:
+            logger.warning("Could not fetch JWKS: %s", error)
+
+
 class VerifyUserID:
     """
     Token verification using PyJWT.
     Returns only the `sub` claim (user ID).
+
+    Payloads of verified tokens are cached by token hash until they expire,
+    so repeated requests with the same token skip signature verification.
+    Use the shared `auth` instance, so that the caches are shared too.
     """
 
     def __init__(self):
         self.config = settings
 
-        # This gets the JWKS from a given URL and does processing so you can
-        # use any of the keys available
-        jwks_url = f"https://{self.config.auth0_domain}/.well-known/jwks.json"
-        self.jwks_client = jwt.PyJWKClient(jwks_url)
+        jwks_url = (
+            self.config.auth0_jwks_url
+            or f"https://{self.config.auth0_domain}/.well-known/jwks.json"
+        )
+        self.jwks = JWKSCache(
+            jwks_url,
+            refresh_seconds=self.config.auth_jwks_refresh_seconds,
+            min_refetch_seconds=self.config.auth_jwks_min_refetch_seconds,
+        )
+        self.verified_tokens: LRUCache[bytes, dict[str, Any]] = LRUCache(
+            self.config.auth_token_cache_size
+        )
 
     async def __call__(  # noqa: C901
         self,
@@ -50,17 +126,37 @@ class VerifyUserID:
         if token is None:
             raise UnauthenticatedException
 
+        payload = await self._verify(token.credentials)
+
+        if security_scopes.scopes:
+            self._check_claims(payload, "scope", security_scopes.scopes)
+
+        user_id = payload.get("sub")
+        if not user_id:
+            raise UnauthorizedException(detail='Missing "sub" claim in token')
+
+        return user_id
+
+    async def _verify(self, token: str) -> dict[str, Any]:
+        """Returns the payload of a valid token, raises 403 otherwise."""
+        token_hash = hashlib.sha256(token.encode()).digest()
+        if (payload := self.verified_tokens.get(token_hash)) is not None:
+            return payload
+
         # This gets the 'kid' from the passed token
         try:
-            signing_key = self.jwks_client.get_signing_key_from_jwt(
-                token.credentials
-            ).key
-        except (jwt.exceptions.PyJWKClientError, jwt.exceptions.DecodeError) as error:
+            kid = jwt.get_unverified_header(token).get("kid")
+            signing_key = (await self.jwks.get_signing_key(kid)).key
+        except (
+            jwt.exceptions.PyJWKClientError,
+            jwt.exceptions.PyJWKSetError,  # Unusable key set fetched
+            jwt.exceptions.DecodeError,
+        ) as error:
             raise UnauthorizedException(str(error))
 
         try:
             payload = jwt.decode(
-                token.credentials,
+                token,
                 signing_key,
                 algorithms=self.config.auth0_algorithms,
                 audience=self.config.auth0_api_audience,
@@ -69,14 +165,13 @@ class VerifyUserID:
         except Exception as error:
             raise UnauthorizedException(str(error))
 
-        if security_scopes.scopes:
-            self._check_claims(payload, "scope", security_scopes.scopes)
-
-        user_id = payload.get("sub")
-        if not user_id:
-            raise UnauthorizedException(detail='Missing "sub" claim in token')
+        # Tokens without expiry are verified every time
+        if "exp" in payload:
+            ttl = payload["exp"] - time.time()
+            if ttl > 0:
+                self.verified_tokens.set(token_hash, payload, ttl_seconds=ttl)
 
-        return user_id
+        return payload
 
     def _check_claims(self, payload, claim_name, expected_value) -> None:
         if claim_name not in payload:
@@ -93,3 +188,6 @@ class VerifyUserID:
         for value in expected_value:
             if value not in payload_claim:
                 raise UnauthorizedException(detail=f'Missing "{claim_name}" scope')
+
+
+auth = VerifyUserID()
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Thread-safe in-memory LRU cache.
+
+    Entries expire after `ttl_seconds` (if set) or the per-entry ttl given to
+    `set`. Once `max_size` entries are stored, the least recently used one is
+    evicted.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float | None = None):
+        self._max_size = max_size
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[K, tuple[V, float | None]] = OrderedDict()
+        self._stats = CacheStats()
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[1] is not None and entry[1] < time.time():
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self._stats.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return entry[0]
+
+    def set(self, key: K, value: V, ttl_seconds: float | None = None) -> None:
+        ttl = ttl_seconds if ttl_seconds is not None else self._ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        self._stats.size = len(self._entries)
+        return self._stats
+
+
+class CoalescingCache(Generic[K, V]):
+    """
+    Async read-through cache in front of an `LRUCache`.
+
+    Concurrent misses for the same key share a single computation, which keeps
+    running even if the caller that started it is cancelled. Failed
+    computations are not cached. If given, `ttl_seconds` returns the TTL of a
+    computed value, None meaning the cache's default.
+    """
+
+    def __init__(
+        self,
+        cache: LRUCache[K, V],
+        ttl_seconds: Callable[[V], float | None] | None = None,
+    ):
+        self._cache = cache
+        self._ttl_seconds = ttl_seconds
+        self._in_flight: dict[K, asyncio.Task[V]] = {}
+        self.coalesced = 0
+
+    async def get_or_compute(self, key: K, compute: Callable[[], Awaitable[V]]) -> V:
+        if (value := self._cache.get(key)) is not None:
+            return value
+
+        if (task := self._in_flight.get(key)) is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.create_task(self._compute(key, compute))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda task: self._forget(key, task))
+
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: K) -> None:
+        self._cache.delete(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> CacheStats:
+        return self._cache.stats()
+
+    def _forget(self, key: K, task: "asyncio.Task[V]") -> None:
+        self._in_flight.pop(key, None)
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _compute(self, key: K, compute: Callable[[], Awaitable[V]]) -> V:
+        value = await compute()
+        ttl = self._ttl_seconds(value) if self._ttl_seconds is not None else None
+        self._cache.set(key, value, ttl_seconds=ttl)
+        return value
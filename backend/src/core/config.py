@@ -9,26 +9,77 @@ class Settings(BaseSettings):
     skip_auth: bool  # Temporary, for easy disabling of auth during development
     max_file_size: int
     gemini_api_key: str
+    derivative_workers: int = 2  # Threads generating resized image variants
+    # Variant jobs waiting or running. When full, uploads skip generating variants
+    # (they are made on first request) and such requests are rejected with 429.
+    derivative_max_queue_size: int = 256
+    # If set, images are sent by nginx from this internal location
+    image_accel_redirect_prefix: str | None = None
 
     # Model
-    detection_model: Literal["YOLO", "RTDETR"]
+    detection_model: Literal["YOLO", "RTDETR", "ONNX"]
+    detection_warm_up: bool = True  # Load the model at startup, not on first use
+    detection_max_batch_size: int = 8
+    detection_max_batch_wait_ms: float = 10
+    detection_max_queue_size: int = 64  # Further requests are rejected with 429
+    detection_cache_size: int = 1024
+    detection_cache_ttl_seconds: float = 10 * 60
+    # Results whose labels fell back to the detector's (Gemini unavailable)
+    detection_degraded_cache_ttl_seconds: float = 30
+    detection_workers: int = 0  # Separate detection processes, 0 to run in-process
+    detection_worker_threads: int = 1  # Compute threads per detection process
+
+    # ONNX Runtime backend, 0 threads means the ONNX Runtime default
+    onnx_intra_op_threads: int = 0
+    onnx_inter_op_threads: int = 0
+    onnx_quantize: bool = False  # Dynamic int8 quantization
+
+    # Gemini relabeling of detected boxes
+    relabel_max_concurrency: int = 16
+    relabel_box_timeout_seconds: float = 5
+    relabel_request_timeout_seconds: float = 10
+    relabel_breaker_failure_threshold: int = 5
+    relabel_breaker_cooldown_seconds: float = 30
+    relabel_cache_size: int = 10_000
+    relabel_cache_ttl_seconds: float = 7 * 24 * 60 * 60
+    relabel_cache_dir: str | None = None  # Persistent tier, disabled if unset
+    relabel_cache_max_disk_entries: int = 100_000
+
+    # Vector tiles of item locations
+    tile_max_features: int = 5000  # Newest items are kept if a tile has more
+    tile_cache_size: int = 4096
+    tile_cache_ttl_seconds: float = 10 * 60
+
+    # Achievement catalog, cached per worker and invalidated on changes. The TTL
+    # only matters if a change notification is lost.
+    achievement_cache_ttl_seconds: float = 10 * 60
 
     # Auth0
     auth0_domain: str
     auth0_api_audience: str
     auth0_issuer: str
     auth0_algorithms: str
+    auth0_jwks_url: str | None = None  # Defaults to the tenant's JWKS
+    auth_jwks_refresh_seconds: float = 10 * 60
+    auth_jwks_min_refetch_seconds: float = 30  # For tokens with unknown keys
+    auth_token_cache_size: int = 10_000  # Verified tokens, kept until expiry
 
     # Postgres
     postgres_user: str
     postgres_password: str
     postgres_db: str
     postgres_host: str
+    db_pool_size: int = 10  # Connections kept open per worker
+    db_max_overflow: int = 10  # Extra connections opened under load
+    db_pool_timeout_seconds: float = 30  # Wait for a free connection
+    db_pool_recycle_seconds: float = 30 * 60
+    db_pool_pre_ping: bool = True  # Check connections before use
+    db_statement_timeout_ms: float = 30_000  # 0 to disable
 
     @property
     def database_url(self) -> str:
         return (
-            f"postgresql://"
+            f"postgresql+asyncpg://"
             f"{self.postgres_user}:{self.postgres_password}"
             f"@{self.postgres_host}/{self.postgres_db}"
         )
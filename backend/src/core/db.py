@@ -1,20 +1,49 @@
 from typing import Annotated
 
 from fastapi import Depends
-from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from core.config import settings
 
-engine = create_engine(settings.database_url)
 
+def _connect_args() -> dict:
+    if not settings.db_statement_timeout_ms:
+        return {}
+    # Applied by the server to every statement on the connection
+    return {
+        "server_settings": {
+            "statement_timeout": str(int(settings.db_statement_timeout_ms))
+        }
+    }
 
-def setup_db():
-    SQLModel.metadata.create_all(bind=engine)
 
+engine = create_async_engine(
+    settings.database_url,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout_seconds,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    connect_args=_connect_args(),
+)
 
-def get_session():
-    with Session(engine) as session:
+# Objects stay usable after commit, as expired attributes cannot be lazily
+# reloaded in async code
+session_factory = async_sessionmaker(
+    engine, class_=AsyncSession, expire_on_commit=False
+)
+
+
+async def setup_db():
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+
+
+async def get_session():
+    async with session_factory() as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_session)]
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
@@ -0,0 +1,87 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from tempfile import mkstemp
+
+from PIL import Image, ImageOps
+
+from core.config import settings
+from core.image_paths import IMAGE_ROOT, VARIANTS, derivative_key
+from core.uploads import STORED_FILE_MODE
+
+logger = logging.getLogger(__name__)
+
+_pool = ThreadPoolExecutor(
+    max_workers=settings.derivative_workers, thread_name_prefix="derivatives"
+)
+
+# Queued or running jobs by image key
+_pending: dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+
+def _save_atomically(image: Image.Image, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = mkstemp(dir=path.parent, prefix=".derivative-")
+    os.fchmod(fd, STORED_FILE_MODE)
+    os.close(fd)
+    try:
+        image.save(tmp_name, format="WEBP", quality=80)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def generate_derivatives(image_key: str) -> None:
+    """
+    Creates all missing variants of an image. The original is decoded once and
+    each variant is resized from the previous, larger one.
+    """
+    missing = [
+        variant
+        for variant in VARIANTS
+        if not (IMAGE_ROOT / derivative_key(image_key, variant)).exists()
+    ]
+    if not missing:
+        return
+
+    with Image.open(IMAGE_ROOT / image_key) as original:
+        if original.format == "JPEG":
+            largest = VARIANTS[missing[0]]
+            original.draft("RGB", (largest, largest))
+        # Variants are stored without EXIF, so the orientation is applied here
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    for variant in missing:
+        size = VARIANTS[variant]
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        _save_atomically(image, IMAGE_ROOT / derivative_key(image_key, variant))
+
+
+def _finish(image_key: str, future: Future) -> None:
+    with _pending_lock:
+        _pending.pop(image_key, None)
+
+    if (error := future.exception()) is not None:
+        logger.error("Could not generate image derivatives", exc_info=error)
+
+
+def schedule_derivatives(image_key: str) -> Future | None:
+    """
+    Generates derivatives in the bounded background worker pool. Returns the
+    job already queued for the image if there is one, or None if
+    `derivative_max_queue_size` jobs are already queued.
+    """
+    with _pending_lock:
+        if (future := _pending.get(image_key)) is not None:
+            return future
+        if len(_pending) >= settings.derivative_max_queue_size:
+            return None
+        future = _pool.submit(generate_derivatives, image_key)
+        _pending[image_key] = future
+
+    future.add_done_callback(lambda done: _finish(image_key, done))
+    return future
@@ -0,0 +1,59 @@
+"""
+What the API process needs to know about the detection backends (input size,
+weights version) without importing them, as importing one loads torch,
+ultralytics, transformers or onnxruntime. With detection workers, only the
+worker processes import the selected backend.
+"""
+
+import os
+from typing import Callable, NamedTuple
+
+from fastapi import HTTPException
+
+from core.config import settings
+
+yolo_weights = "/backend/src/core/detection/models/yolo.pt"
+rt_detr_weights = "/backend/src/core/detection/models/rtdetr.pt"
+rt_detr_checkpoint = "PekingU/rtdetr_r50vd_coco_o365"
+
+
+def _weights_version(path: str) -> str:
+    weights = os.stat(path)
+    return f"{weights.st_size}-{weights.st_mtime_ns}"
+
+
+def yolo_version() -> str:
+    return _weights_version(yolo_weights)
+
+
+def rt_detr_version() -> str:
+    return f"{rt_detr_checkpoint}-{_weights_version(rt_detr_weights)}"
+
+
+def onnx_version() -> str:
+    quantized = "int8" if settings.onnx_quantize else "fp32"
+    return f"{yolo_version()}-{quantized}"
+
+
+class Backend(NamedTuple):
+    module: str
+    input_size: int  # Images are resized to at most this size by the model
+    model_version: Callable[[], str]  # Changes whenever the weights change
+
+
+BACKENDS = {
+    "YOLO": Backend("core.detection.yolo", 640, yolo_version),
+    "RTDETR": Backend("core.detection.rtdetr", 640, rt_detr_version),
+    "ONNX": Backend("core.detection.onnx_yolo", 640, onnx_version),
+}
+
+
+def get_backend() -> Backend:
+    backend = BACKENDS.get(settings.detection_model)
+
+    if backend is None:
+        raise HTTPException(
+            500, "Invalid model configuration. Please notify the administrator."
+        )
+
+    return backend
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, TypeVar
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class BatchStats:
+    queue_depth: int = 0
+    batches: int = 0
+    items: int = 0
+    rejected: int = 0
+    largest_batch: int = 0
+    total_queue_wait_seconds: float = 0.0
+    max_queue_wait_seconds: float = 0.0
+
+
+@dataclass
+class _Pending(Generic[T, R]):
+    item: T
+    future: "asyncio.Future[R]"
+    enqueued_at: float
+
+
+class BatchScheduler(Generic[T, R]):
+    """
+    Collects concurrently submitted items into batches and runs them through
+    `run_batch` in the threadpool, at most `max_concurrent_batches` at a time.
+
+    A batch is dispatched once it has `max_batch_size` items or `max_wait_ms`
+    has passed since its first item arrived. When `max_queue_size` items are
+    already waiting, new submissions are rejected with HTTP 429.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[T]], list[R]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_queue_size: int,
+        max_concurrent_batches: int = 1,
+    ):
+        self._run_batch = run_batch
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max_wait_ms / 1000
+        self._max_queue_size = max_queue_size
+        self._max_concurrent_batches = max(1, max_concurrent_batches)
+        self._queue: asyncio.Queue[_Pending[T, R]] | None = None
+        self._worker: asyncio.Task[Any] | None = None
+        self._stats = BatchStats()
+
+    async def submit(self, item: T) -> R:
+        queue = self._ensure_worker()
+
+        if queue.qsize() >= self._max_queue_size:
+            self._stats.rejected += 1
+            raise HTTPException(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "Detection queue is full. Please try again later.",
+            )
+
+        future: asyncio.Future[R] = asyncio.get_running_loop().create_future()
+        queue.put_nowait(_Pending(item, future, time.perf_counter()))
+        return await future
+
+    def stats(self) -> BatchStats:
+        self._stats.queue_depth = self._queue.qsize() if self._queue else 0
+        return self._stats
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    def _ensure_worker(self) -> "asyncio.Queue[_Pending[T, R]]":
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._process(self._queue))
+
+        return self._queue
+
+    async def _collect_batch(
+        self, queue: "asyncio.Queue[_Pending[T, R]]"
+    ) -> list[_Pending[T, R]]:
+        batch = [await queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._max_wait
+
+        while len(batch) < self._max_batch_size:
+            timeout = deadline - loop.time()
+            try:
+                if timeout <= 0:
+                    batch.append(queue.get_nowait())
+                else:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+
+        # Requests whose clients went away no longer need a result
+        return [pending for pending in batch if not pending.future.done()]
+
+    def _record_dispatch(self, batch: list[_Pending[T, R]]) -> None:
+        dispatched_at = time.perf_counter()
+
+        for pending in batch:
+            wait = dispatched_at - pending.enqueued_at
+            self._stats.total_queue_wait_seconds += wait
+            self._stats.max_queue_wait_seconds = max(
+                self._stats.max_queue_wait_seconds, wait
+            )
+
+        self._stats.batches += 1
+        self._stats.items += len(batch)
+        self._stats.largest_batch = max(self._stats.largest_batch, len(batch))
+
+    async def _run(self, batch: list[_Pending[T, R]]) -> None:
+        try:
+            results = await run_in_threadpool(
+                self._run_batch, [pending.item for pending in batch]
+            )
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+
+        for pending, result in zip(batch, results):
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+    async def _process(self, queue: "asyncio.Queue[_Pending[T, R]]") -> None:
+        slots = asyncio.Semaphore(self._max_concurrent_batches)
+        running: set[asyncio.Task[None]] = set()
+
+        while True:
+            # Keep collecting only while there is a free slot to run the batch
+            await slots.acquire()
+            batch = await self._collect_batch(queue)
+            if not batch:
+                slots.release()
+                continue
+
+            self._record_dispatch(batch)
+            task = asyncio.create_task(self._run(batch))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
@@ -1,20 +1,164 @@
-from fastapi import HTTPException
+import importlib
+from dataclasses import dataclass
+from functools import cache
+from typing import TYPE_CHECKING, Callable, NamedTuple, Protocol
+
+from fastapi.concurrency import run_in_threadpool
 from PIL import Image
 
-import core.detection
-import core.detection.rtdetr
-import core.detection.yolo
+from core.cache import CacheStats, CoalescingCache, LRUCache
 from core.config import settings
+from core.detection.backends import get_backend
+from core.detection.batching import BatchScheduler, BatchStats
+from core.detection.postprocess import into_bounding_boxes
+from core.detection.registry import ModelStats, registry
+from core.detection.relabel import RelabelStats, relabeler
+from core.detection.workers import DetectionWorkerPool
+from core.images import DecodedImage
 from core.models.item import BoundingBoxResponse
+from core.timing import StageTimer
+
+if TYPE_CHECKING:
+    import torch
+
+
+class Detections(NamedTuple):
+    """Raw model output for a single image."""
+
+    boxes: "torch.Tensor"  # (N, 4) float, [xmin, ymin, xmax, ymax]
+    labels: "torch.Tensor"  # (N,) int, class numbers as used by relabeling
+
+
+class Detector(Protocol):
+    """A backend module, see `core.detection.backends`."""
+
+    def detect(self, images: list[Image.Image]) -> list[Detections]:
+        """Run a single batched forward pass over the given images."""
+        ...
+
+    def warm_up(self) -> None:
+        """Load the model and run it once so that the first request is fast."""
+        ...
+
+
+@dataclass
+class DetectionStats:
+    models: dict[str, ModelStats]
+    batching: BatchStats
+    relabel: RelabelStats
+    cache: CacheStats
+    coalesced_requests: int
+
+
+@cache
+def get_detector() -> Detector:
+    # Imported only when used, which is never in the API process when
+    # detection runs in worker processes
+    detector: Detector = importlib.import_module(get_backend().module)  # type: ignore
+    return detector
+
+
+worker_pool = (
+    DetectionWorkerPool(settings.detection_workers, settings.detection_worker_threads)
+    if settings.detection_workers > 0
+    else None
+)
+
+
+def _detect_batch(images: list[Image.Image]) -> list[Detections]:
+    if worker_pool is not None:
+        return worker_pool.detect(images)
+    return get_detector().detect(images)
+
+
+batch_scheduler: BatchScheduler[Image.Image, Detections] = BatchScheduler(
+    _detect_batch,
+    max_batch_size=settings.detection_max_batch_size,
+    max_wait_ms=settings.detection_max_batch_wait_ms,
+    max_queue_size=settings.detection_max_queue_size,
+    max_concurrent_batches=max(1, settings.detection_workers),
+)
+
+
+class DetectionResult(NamedTuple):
+    bounding_boxes: list[BoundingBoxResponse]
+    degraded: bool  # Labels fell back to the detector's, see `Relabeling`
+
+
+def _result_ttl(result: DetectionResult) -> float | None:
+    # Degraded results are only kept briefly, to be relabeled once Gemini is back
+    return settings.detection_degraded_cache_ttl_seconds if result.degraded else None
+
+
+result_cache: CoalescingCache[tuple[str, str, str], DetectionResult] = CoalescingCache(
+    LRUCache(
+        settings.detection_cache_size,
+        ttl_seconds=settings.detection_cache_ttl_seconds,
+    ),
+    ttl_seconds=_result_ttl,
+)
+
+
+async def _detect(
+    load_image: Callable[[], DecodedImage], timer: StageTimer
+) -> DetectionResult:
+    with timer.stage("decode"):
+        decoded = await run_in_threadpool(load_image)
+
+    image = decoded.image
+    with timer.stage("detect"):
+        detections = await batch_scheduler.submit(image)
+    with timer.stage("relabel"):
+        relabeling = await relabeler.relabel(image, detections)
+
+    with timer.stage("postprocess"):
+        width, height = decoded.original_size
+        bounding_boxes = into_bounding_boxes(
+            detections.boxes, relabeling.labels, width, height, scale=decoded.scale
+        )
+        return DetectionResult(bounding_boxes, relabeling.degraded)
+
+
+async def get_bounding_boxes(
+    image_digest: str,
+    load_image: Callable[[], DecodedImage],
+    timer: StageTimer | None = None,
+) -> list[BoundingBoxResponse]:
+    """
+    Detect items on the image identified by `image_digest`.
+
+    Results are cached per digest and model version (results whose relabeling
+    fell back to the detector's labels only briefly), and concurrent requests
+    for the same image share a single detection. `load_image` is only called
+    when the image actually has to be analysed, in the thread pool, and may
+    return a downscaled image. Boxes are reported in the coordinates of the
+    original one.
+    """
+    key = (settings.detection_model, get_backend().model_version(), image_digest)
+    result = await result_cache.get_or_compute(
+        key, lambda: _detect(load_image, timer or StageTimer())
+    )
+    return result.bounding_boxes
+
+
+def warm_up_detector() -> None:
+    if worker_pool is not None:
+        worker_pool.start()
+    else:
+        get_detector().warm_up()
+
+
+async def shutdown_detector() -> None:
+    await batch_scheduler.close()
+    if worker_pool is not None:
+        worker_pool.shutdown()
 
 
-def get_bounding_boxes(image: Image.Image) -> list[BoundingBoxResponse]:
-    match settings.detection_model:
-        case "YOLO":
-            return core.detection.yolo.get_bounding_boxes(image)
-        case "RTDETR":
-            return core.detection.rtdetr.get_bounding_boxes(image)
-        case _:
-            raise HTTPException(
-                500, "Invalid model configuration. Please notify the administrator."
-            )
+def get_detection_stats() -> DetectionStats:
+    return DetectionStats(
+        models=registry.stats(),
+        batching=batch_scheduler.stats(),
+        relabel=relabeler.stats(),
+        cache=result_cache.stats(),
+        coalesced_requests=result_cache.coalesced,
+    )
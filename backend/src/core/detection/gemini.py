@@ -0,0 +1,11 @@
+from functools import cache
+
+from google import genai
+
+from core.config import settings
+
+
+@cache
+def get_client() -> genai.Client:
+    """Shared Gemini client, created on first use."""
+    return genai.Client(api_key=settings.gemini_api_key)
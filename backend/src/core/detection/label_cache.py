@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from core.cache import CacheStats, LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LabelCacheStats:
+    memory: CacheStats
+    disk_hits: int = 0
+    disk_misses: int = 0
+
+
+class LabelCache:
+    """
+    Relabeling results keyed by the digest of the crop they were computed for.
+
+    Lookups go to an in-memory LRU first and then, if `directory` is set, to a
+    persistent tier storing one small file per digest. Both tiers expire
+    entries after `ttl_seconds`. The disk tier is pruned back to
+    `max_disk_entries` (oldest first) every `max_disk_entries // 10` writes.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: float,
+        directory: str | None = None,
+        max_disk_entries: int = 100_000,
+    ):
+        self._memory: LRUCache[str, int] = LRUCache(max_size, ttl_seconds)
+        self._ttl = ttl_seconds
+        self._directory = Path(directory) if directory else None
+        self._max_disk_entries = max_disk_entries
+        self._writes_since_prune = 0
+        self._stats = LabelCacheStats(memory=self._memory.stats())
+
+    def get(self, digest: str) -> int | None:
+        if (label := self._memory.get(digest)) is not None:
+            return label
+
+        if self._directory is None:
+            return None
+
+        label = self._read(digest)
+        if label is None:
+            self._stats.disk_misses += 1
+            return None
+
+        self._stats.disk_hits += 1
+        self._memory.set(digest, label)
+        return label
+
+    def set(self, digest: str, label: int) -> None:
+        self._memory.set(digest, label)
+
+        if self._directory is None:
+            return
+
+        try:
+            path = self._path(digest)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(str(label))
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception("Could not persist relabeling result")
+            return
+
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= max(1, self._max_disk_entries // 10):
+            self._writes_since_prune = 0
+            self.prune()
+
+    def prune(self) -> None:
+        """Remove expired entries and the oldest ones above the size limit."""
+        if self._directory is None:
+            return
+
+        now = time.time()
+        entries = []
+
+        for path in self._directory.glob("*/*"):
+            try:
+                mtime = path.stat().st_mtime
+                if now - mtime > self._ttl:
+                    path.unlink()
+                else:
+                    entries.append((mtime, path))
+            except OSError:
+                continue
+
+        entries.sort()
+        for _, path in entries[: max(0, len(entries) - self._max_disk_entries)]:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> LabelCacheStats:
+        self._stats.memory = self._memory.stats()
+        return self._stats
+
+    def _path(self, digest: str) -> Path:
+        assert self._directory is not None
+        return self._directory / digest[:2] / digest
+
+    def _read(self, digest: str) -> int | None:
+        path = self._path(digest)
+        try:
+            if time.time() - path.stat().st_mtime > self._ttl:
+                path.unlink(missing_ok=True)
+                return None
+            return int(path.read_text())
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,58 @@
+import numpy as np
+import torch
+
+try:
+    from torchvision.ops import nms as _torchvision_nms  # type: ignore
+except ImportError:
+    _torchvision_nms = None
+
+
+def _nms_numpy(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float):
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort(kind="stable")[::-1]
+    keep = []
+
+    while order.size > 0:
+        current, rest = order[0], order[1:]
+        keep.append(current)
+
+        inter_width = np.maximum(
+            0, np.minimum(x2[current], x2[rest]) - np.maximum(x1[current], x1[rest])
+        )
+        inter_height = np.maximum(
+            0, np.minimum(y2[current], y2[rest]) - np.maximum(y1[current], y1[rest])
+        )
+        inter_area = inter_width * inter_height
+        union_area = areas[current] + areas[rest] - inter_area
+        ious = np.divide(
+            inter_area,
+            union_area,
+            out=np.zeros_like(inter_area),
+            where=union_area != 0,
+        )
+
+        order = rest[ious <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
+
+
+def nms(boxes: torch.Tensor, scores: torch.Tensor, iou_threshold: float):
+    """
+    Class-agnostic non-maximum suppression over [xmin, ymin, xmax, ymax] boxes.
+
+    Returns indices of the kept boxes, by decreasing score. Uses torchvision
+    when it is installed and a vectorized NumPy implementation otherwise.
+    """
+    if boxes.numel() == 0:
+        return torch.empty((0,), dtype=torch.long)
+
+    if _torchvision_nms is not None:
+        return _torchvision_nms(boxes.float(), scores.float(), iou_threshold)
+
+    keep = _nms_numpy(
+        boxes.detach().cpu().double().numpy(),
+        scores.detach().cpu().double().numpy(),
+        iou_threshold,
+    )
+    return torch.from_numpy(keep).to(boxes.device)
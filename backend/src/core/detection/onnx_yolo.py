@@ -0,0 +1,201 @@
+"""
+YOLO exported to ONNX and run with ONNX Runtime on the CPU.
+
+The graph is exported from the YOLO weights on first use (and again when they
+change) and optionally quantized to int8. Pre- and post-processing mirror what
+ultralytics does for the eager model, so both backends report the same boxes.
+"""
+
+import fcntl
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import mkstemp
+from typing import Callable, Iterator
+
+import numpy as np
+import onnxruntime as ort  # type: ignore
+import torch
+from PIL import Image
+
+from core.config import settings
+from core.detection.backends import BACKENDS, onnx_version, yolo_version, yolo_weights
+from core.detection.detection import Detections
+from core.detection.nms import nms
+from core.detection.registry import registry
+
+models_dir = Path(yolo_weights).parent
+
+input_size = BACKENDS["ONNX"].input_size
+# Same defaults as ultralytics predictions
+confidence_threshold = 0.25
+class_iou_threshold = 0.7
+max_detections = 300
+
+
+def _onnx_path(quantized: bool) -> Path:
+    """
+    Graph exported from the current weights. The name includes their version,
+    so that changed weights are exported again.
+    """
+    suffix = ".int8.onnx" if quantized else ".onnx"
+    return models_dir / f"yolo-{yolo_version()}{suffix}"
+
+
+@contextmanager
+def _export_lock() -> Iterator[None]:
+    """Held while exporting, as every process (e.g. detection workers) may try."""
+    with open(models_dir / ".onnx-export.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _replace_atomically(write: Callable[[str], None], path: Path):
+    """Calls `write` with a temporary path and renames the result to `path`."""
+    fd, tmp_name = mkstemp(dir=path.parent, prefix=".export-", suffix=path.suffix)
+    os.close(fd)
+    try:
+        write(tmp_name)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _export_onnx(target: str):
+    from ultralytics import YOLO  # type: ignore
+
+    exported = YOLO(yolo_weights).export(format="onnx", imgsz=input_size, dynamic=True)
+    os.replace(exported, target)
+
+
+def _quantize(source: Path, target: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic  # type: ignore
+
+    quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+
+
+def _export_model() -> Path:
+    path = _onnx_path(settings.onnx_quantize)
+    if path.exists():
+        return path
+
+    with _export_lock():
+        # Checked again, as another process may have exported it meanwhile
+        onnx_path = _onnx_path(quantized=False)
+        if not onnx_path.exists():
+            _replace_atomically(_export_onnx, onnx_path)
+
+        if settings.onnx_quantize and not path.exists():
+            _replace_atomically(lambda target: _quantize(onnx_path, target), path)
+
+    return path
+
+
+def _load_session() -> ort.InferenceSession:
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = settings.onnx_intra_op_threads
+    options.inter_op_num_threads = settings.onnx_inter_op_threads
+
+    return ort.InferenceSession(
+        str(_export_model()), sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+def _warm_up_session(session: ort.InferenceSession):
+    session.run(None, {session.get_inputs()[0].name: _preprocess([_blank()])[0]})
+
+
+def _blank() -> Image.Image:
+    return Image.new("RGB", (input_size, input_size))
+
+
+def get_session() -> ort.InferenceSession:
+    return registry.get(
+        "onnx", _load_session, warm_up=_warm_up_session, version=model_version()
+    )
+
+
+def warm_up():
+    get_session()
+
+
+def model_version() -> str:
+    return onnx_version()
+
+
+def _preprocess(
+    images: list[Image.Image],
+) -> tuple[np.ndarray, list[tuple[float, float, float]]]:
+    """
+    Letterboxes images into a (B, 3, 640, 640) batch.
+    Returns the batch and (scale, x padding, y padding) of every image.
+    """
+    batch: np.ndarray = np.full(
+        (len(images), input_size, input_size, 3), 114, dtype=np.uint8
+    )
+    transforms = []
+
+    for i, image in enumerate(images):
+        width, height = image.size
+        scale = min(input_size / width, input_size / height)
+        new_width, new_height = round(width * scale), round(height * scale)
+        pad_x = (input_size - new_width) // 2
+        pad_y = (input_size - new_height) // 2
+
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        resized = image.resize((new_width, new_height), Image.Resampling.BILINEAR)
+        batch[i, pad_y : pad_y + new_height, pad_x : pad_x + new_width] = resized
+        transforms.append((scale, pad_x, pad_y))
+
+    return batch.transpose(0, 3, 1, 2).astype(np.float32) / 255, transforms
+
+
+def _postprocess(
+    output: np.ndarray, transform: tuple[float, float, float], size: tuple[int, int]
+) -> Detections:
+    """Decodes a single (4 + classes, anchors) output of the exported model."""
+    predictions = output.T
+    class_scores = predictions[:, 4:]
+    labels = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(labels)), labels]
+
+    candidates = scores > confidence_threshold
+    centers = predictions[candidates, :2]
+    half_sizes = predictions[candidates, 2:4] / 2
+
+    scale, pad_x, pad_y = transform
+    boxes = np.concatenate([centers - half_sizes, centers + half_sizes], axis=1)
+    boxes = (boxes - [pad_x, pad_y, pad_x, pad_y]) / scale
+    boxes[:, 0::2] = boxes[:, 0::2].clip(0, size[0])
+    boxes[:, 1::2] = boxes[:, 1::2].clip(0, size[1])
+
+    boxes_tensor = torch.from_numpy(boxes).float()
+    scores_tensor = torch.from_numpy(scores[candidates]).float()
+    labels_tensor = torch.from_numpy(labels[candidates]).long()
+
+    # Per-class NMS as done by ultralytics, by moving each class far apart
+    offsets = labels_tensor[:, None].float() * (max(size) + 1)
+    keep = nms(boxes_tensor + offsets, scores_tensor, class_iou_threshold)
+    keep = keep[:max_detections]
+
+    # Then the class-agnostic NMS applied to the eager YOLO backend
+    keep = keep[nms(boxes_tensor[keep], scores_tensor[keep], iou_threshold=0.95)]
+
+    return Detections(boxes=boxes_tensor[keep], labels=labels_tensor[keep])
+
+
+def detect(images: list[Image.Image]) -> list[Detections]:
+    session = get_session()
+    batch, transforms = _preprocess(images)
+    (outputs,) = session.run(None, {session.get_inputs()[0].name: batch})
+
+    return [
+        _postprocess(output, transform, image.size)
+        for output, transform, image in zip(outputs, transforms, images)
+    ]
@@ -0,0 +1,67 @@
+from typing import Sequence
+
+import numpy as np
+
+from core.models.item import BoundingBoxResponse, ItemType
+
+# Indexed by class number, the last entry is used for any unknown class
+_ITEM_TYPES = np.array(
+    [
+        ItemType.paper,
+        ItemType.glass,
+        ItemType.metal,
+        ItemType.plastic,
+        ItemType.unknown,
+    ],
+    dtype=object,
+)
+
+
+def into_bounding_boxes(
+    boxes,
+    labels: Sequence[int],
+    width: int,
+    height: int,
+    scale: tuple[float, float] = (1.0, 1.0),
+) -> list[BoundingBoxResponse]:
+    """
+    Converts (N, 4) [xmin, ymin, xmax, ymax] float boxes and their class numbers
+    into responses for an image of the given size. Box coordinates are first
+    multiplied by the (x, y) `scale`.
+
+    Coordinates are rounded outwards and clipped to the image. Boxes left with
+    no area are dropped.
+    """
+    if len(labels) == 0:
+        return []
+
+    coords = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+    coords *= np.array([scale[0], scale[1], scale[0], scale[1]])
+    coords[:, :2] = np.floor(coords[:, :2])
+    coords[:, 2:] = np.ceil(coords[:, 2:])
+    coords[:, 0::2] = coords[:, 0::2].clip(0, width - 1)
+    coords[:, 1::2] = coords[:, 1::2].clip(0, height - 1)
+    coords = coords.astype(np.int64)
+
+    classes = np.asarray(labels, dtype=np.int64)
+    classes = np.where(
+        (classes >= 0) & (classes < len(_ITEM_TYPES) - 1),
+        classes,
+        len(_ITEM_TYPES) - 1,
+    )
+
+    valid = (coords[:, 2] > coords[:, 0]) & (coords[:, 3] > coords[:, 1])
+    item_types = _ITEM_TYPES[classes[valid]]
+
+    return [
+        BoundingBoxResponse(
+            item_type=item_type,
+            x_left=x_left,
+            y_top=y_top,
+            x_right=x_right,
+            y_bottom=y_bottom,
+        )
+        for item_type, (x_left, y_top, x_right, y_bottom) in zip(
+            item_types, coords[valid].tolist()
+        )
+    ]
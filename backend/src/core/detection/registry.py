@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelStats:
+    load_count: int = 0
+    load_seconds: float | None = None
+    warm_up_seconds: float | None = None
+    loaded_at: datetime | None = None
+
+
+class ModelRegistry:
+    """
+    Process-wide store of loaded models.
+
+    Every model is loaded at most once (per reload) even when requested
+    concurrently from the threadpool, and kept in memory afterwards. A model
+    requested with a different `version` than the loaded one (e.g. because its
+    weights changed) is loaded again and replaces it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._models: dict[str, tuple[Any, str | None]] = {}  # Model, version
+        self._stats: dict[str, ModelStats] = {}
+
+    def _loaded(self, name: str, version: str | None) -> Any:
+        model, loaded_version = self._models.get(name, (None, None))
+        return model if loaded_version == version else None
+
+    def get(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        warm_up: Callable[[Any], None] | None = None,
+        version: str | None = None,
+    ) -> Any:
+        if (model := self._loaded(name, version)) is not None:
+            return model
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            # Another thread may have finished loading while we were waiting
+            if (model := self._loaded(name, version)) is not None:
+                return model
+
+            stats = self._stats.setdefault(name, ModelStats())
+
+            start = time.perf_counter()
+            model = loader()
+            stats.load_seconds = time.perf_counter() - start
+
+            if warm_up is not None:
+                start = time.perf_counter()
+                warm_up(model)
+                stats.warm_up_seconds = time.perf_counter() - start
+
+            stats.load_count += 1
+            stats.loaded_at = datetime.now()
+            self._models[name] = (model, version)
+
+            logger.info(
+                "Loaded model %s %s(load #%d) in %.2fs, warm-up %s",
+                name,
+                f"version {version} " if version is not None else "",
+                stats.load_count,
+                stats.load_seconds,
+                (
+                    f"{stats.warm_up_seconds:.2f}s"
+                    if stats.warm_up_seconds is not None
+                    else "skipped"
+                ),
+            )
+
+            return model
+
+    def unload(self, name: str) -> None:
+        """Drop a model so that the next `get` loads it again."""
+        with self._lock:
+            self._models.pop(name, None)
+
+    def stats(self) -> dict[str, ModelStats]:
+        return dict(self._stats)
+
+
+registry = ModelRegistry()
@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import io
+import logging
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from google.genai import types
+from PIL import Image
+
+from core.config import settings
+from core.detection.gemini import get_client
+from core.detection.label_cache import LabelCache, LabelCacheStats
+
+if TYPE_CHECKING:
+    from core.detection.detection import Detections
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = "gemini-2.5-flash-preview-04-17"
+PROMPT = (
+    "What type of trash is in the picture? Choose between: "
+    "Paper, Plastic, Metal, Glass. Respond using only one word."
+)
+
+
+def get_class_number(name: str) -> int:
+    if "Paper" in name:
+        return 0
+    if "Glass" in name:
+        return 1
+    if "Metal" in name:
+        return 2
+    if "Plastic" in name:
+        return 3
+    return -1
+
+
+@dataclass
+class Crop:
+    digest: str  # Identifies the crop pixels and the question asked about them
+    label: int | None = None  # Cached relabeling result
+    image_bytes: bytes | None = None  # JPEG, only encoded when not cached
+
+
+def prepare_crops(
+    image: Image.Image, boxes, cache: LabelCache | None = None
+) -> list[Crop | None]:
+    """
+    Crops every [xmin, ymin, xmax, ymax] box and looks it up in the cache.
+    Crops that are not cached are JPEG-encoded. Empty boxes are returned as None.
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    crops: list[Crop | None] = []
+
+    for box in boxes.tolist():
+        x1, y1 = int(np.floor(box[0])), int(np.floor(box[1]))
+        x2, y2 = int(np.ceil(box[2])), int(np.ceil(box[3]))
+        if x2 <= x1 or y2 <= y1:
+            crops.append(None)
+            continue
+
+        cropped_image = image.crop((x1, y1, x2, y2))
+        digest = hashlib.sha256(
+            f"{GEMINI_MODEL}\n{PROMPT}\n{cropped_image.size}\n".encode()
+            + cropped_image.tobytes()
+        ).hexdigest()
+
+        if cache is not None and (label := cache.get(digest)) is not None:
+            crops.append(Crop(digest, label=label))
+            continue
+
+        buffer = io.BytesIO()
+        cropped_image.save(buffer, format="JPEG")
+        crops.append(Crop(digest, image_bytes=buffer.getvalue()))
+
+    return crops
+
+
+class Relabeling(NamedTuple):
+    labels: list[int]
+    # Some boxes kept the detector's label because Gemini could not be asked
+    # (breaker open) or did not answer in time
+    degraded: bool
+
+
+@dataclass
+class RelabelStats:
+    requests: int = 0
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    skipped_requests: int = 0  # Relabeling skipped as the breaker was open
+    breaker_open: bool = False
+    cache: LabelCacheStats | None = None
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and stays open for
+    `cooldown_seconds`. After that, calls are let through again and the first
+    failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown_seconds
+        self._consecutive_failures = 0
+        self._opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        if self._opened_at is None:
+            return False
+        return time.monotonic() - self._opened_at < self._cooldown
+
+    def record_success(self) -> None:
+        self._consecutive_failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self._consecutive_failures += 1
+
+        half_open = self._opened_at is not None
+        if half_open or self._consecutive_failures >= self._failure_threshold:
+            if not self.is_open:
+                logger.warning("Relabeling circuit breaker opened")
+            self._opened_at = time.monotonic()
+
+
+class Relabeler:
+    """
+    Asks Gemini for the label of every detected box, concurrently.
+
+    At most `max_concurrency` calls are in flight across all requests. A box
+    whose call fails or exceeds `box_timeout` seconds, or is still pending
+    after `request_timeout` seconds, keeps the label assigned by the detector.
+    While the circuit breaker is open, Gemini is not called at all.
+
+    Results are stored in `cache`, so crops that were already relabeled are not
+    sent to Gemini again.
+
+    `client_factory` must return an object with the `google.genai.Client`
+    interface; tests can pass a local fake.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        max_concurrency: int,
+        box_timeout: float,
+        request_timeout: float,
+        breaker: CircuitBreaker,
+        cache: LabelCache | None = None,
+    ):
+        self._client_factory = client_factory
+        self._max_concurrency = max_concurrency
+        self._semaphore: asyncio.Semaphore | None = None
+        self._box_timeout = box_timeout
+        self._request_timeout = request_timeout
+        self._breaker = breaker
+        self._cache = cache
+        self._stats = RelabelStats()
+
+    async def relabel(self, image: Image.Image, detections: "Detections") -> Relabeling:
+        fallback_labels: list[int] = detections.labels.tolist()
+        if not fallback_labels:
+            return Relabeling([], degraded=False)
+
+        self._stats.requests += 1
+
+        crops = await run_in_threadpool(
+            prepare_crops, image, detections.boxes, self._cache
+        )
+        labels = [
+            crop.label if crop is not None and crop.label is not None else -1
+            for crop in crops
+        ]
+
+        uncached = {
+            i: crop.image_bytes
+            for i, crop in enumerate(crops)
+            if crop is not None and crop.image_bytes is not None
+        }
+        degraded = False
+        if uncached:
+            if self._breaker.is_open:
+                self._stats.skipped_requests += 1
+                degraded = True
+            else:
+                new_labels = await self._get_labels(uncached)
+                await run_in_threadpool(self._store, crops, new_labels)
+                for i, label in new_labels.items():
+                    labels[i] = label
+                degraded = len(new_labels) < len(uncached)
+
+        return Relabeling(
+            [
+                fallback if label == -1 else label
+                for label, fallback in zip(labels, fallback_labels)
+            ],
+            degraded,
+        )
+
+    async def _get_labels(self, crops: dict[int, bytes]) -> dict[int, int]:
+        """
+        Asks Gemini about all crops concurrently, within the request deadline.
+        Crops without an answer are left out of the result.
+        """
+        tasks = {
+            i: asyncio.create_task(self._get_label(image_bytes))
+            for i, image_bytes in crops.items()
+        }
+
+        done, pending = await asyncio.wait(
+            tasks.values(), timeout=self._request_timeout
+        )
+        for task in pending:
+            task.cancel()
+        self._stats.timeouts += len(pending)
+
+        return {
+            i: label
+            for i, task in tasks.items()
+            if task in done and (label := task.result()) is not None
+        }
+
+    def _store(self, crops: list[Crop | None], labels: dict[int, int]) -> None:
+        if self._cache is None:
+            return
+
+        for i, label in labels.items():
+            crop = crops[i]
+            if crop is not None:
+                self._cache.set(crop.digest, label)
+
+    def stats(self) -> RelabelStats:
+        self._stats.breaker_open = self._breaker.is_open
+        self._stats.cache = self._cache.stats() if self._cache else None
+        return self._stats
+
+    async def _get_label(self, image_bytes: bytes) -> int | None:
+        """
+        Returns the class number reported by Gemini (-1 if the answer was not
+        a known class) or None if Gemini did not answer.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async with self._semaphore:
+            if self._breaker.is_open:
+                return None
+
+            self._stats.calls += 1
+            try:
+                response = await asyncio.wait_for(
+                    self._client_factory().aio.models.generate_content(
+                        model=GEMINI_MODEL,
+                        contents=[
+                            types.Part.from_bytes(
+                                data=image_bytes, mime_type="image/jpeg"
+                            ),
+                            PROMPT,
+                        ],
+                    ),
+                    timeout=self._box_timeout,
+                )
+            except asyncio.TimeoutError:
+                self._stats.timeouts += 1
+                self._breaker.record_failure()
+                return None
+            except Exception:
+                self._stats.failures += 1
+                self._breaker.record_failure()
+                return None
+
+        self._breaker.record_success()
+        return get_class_number(response.text or "")
+
+
+relabeler = Relabeler(
+    get_client,
+    max_concurrency=settings.relabel_max_concurrency,
+    box_timeout=settings.relabel_box_timeout_seconds,
+    request_timeout=settings.relabel_request_timeout_seconds,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.relabel_breaker_failure_threshold,
+        cooldown_seconds=settings.relabel_breaker_cooldown_seconds,
+    ),
+    cache=LabelCache(
+        max_size=settings.relabel_cache_size,
+        ttl_seconds=settings.relabel_cache_ttl_seconds,
+        directory=settings.relabel_cache_dir,
+        max_disk_entries=settings.relabel_cache_max_disk_entries,
+    ),
+)
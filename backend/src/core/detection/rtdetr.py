@@ -1,22 +1,22 @@
-import io
 from typing import Dict
 
-import numpy as np
 import torch
-from google import genai
-from google.genai import types
 from PIL import Image
 from transformers import RTDetrForObjectDetection, RTDetrImageProcessor  # type:ignore
 
-from core.config import settings
-from core.models.item import BoundingBoxResponse, ItemType
+from core.detection.backends import (
+    rt_detr_checkpoint,
+    rt_detr_version,
+    rt_detr_weights,
+)
+from core.detection.detection import Detections
+from core.detection.registry import registry
 
-client = genai.Client(api_key=settings.gemini_api_key)
-model_path_rt_detr = "/backend/src/core/detection/models/rtdetr.pt"
+model_path_rt_detr = rt_detr_weights
 
 
 def get_checkpoint_rt_detr():
-    return "PekingU/rtdetr_r50vd_coco_o365"
+    return rt_detr_checkpoint
 
 
 def load_model_rt_detr(model_path):
@@ -34,44 +34,83 @@ def load_model_rt_detr(model_path):
     return rtdetr_model
 
 
-rtdetr_model = load_model_rt_detr(model_path_rt_detr)
+def _load_rt_detr():
+    image_processor = RTDetrImageProcessor.from_pretrained(get_checkpoint_rt_detr())
+    return load_model_rt_detr(model_path_rt_detr), image_processor
 
 
-def process_image_rt_detr(image: Image.Image) -> Dict[str, torch.Tensor]:
-    checkpoint = get_checkpoint_rt_detr()
-    image_processor = RTDetrImageProcessor.from_pretrained(checkpoint)
-    rtdetr_model = load_model_rt_detr(model_path_rt_detr)
+def _warm_up_rt_detr(loaded):
+    rtdetr_model, image_processor = loaded
+    inputs = image_processor(images=Image.new("RGB", (640, 640)), return_tensors="pt")
+    with torch.no_grad():
+        rtdetr_model(**inputs)
+
+
+def get_model_rt_detr():
+    """
+    Returns the (model, image processor) pair, loading it on first use and again
+    when the weights change.
+    """
+    return registry.get(
+        "rtdetr", _load_rt_detr, warm_up=_warm_up_rt_detr, version=model_version()
+    )
+
+
+def warm_up():
+    get_model_rt_detr()
+
+
+def model_version() -> str:
+    return rt_detr_version()
+
+
+def process_image_rt_detr(
+    images: list[Image.Image],
+) -> list[Dict[str, torch.Tensor]]:
+    rtdetr_model, image_processor = get_model_rt_detr()
 
     threshold = 0.6
 
-    inputs = image_processor(images=image, return_tensors="pt")
+    inputs = image_processor(images=images, return_tensors="pt")
 
     with torch.no_grad():
         outputs = rtdetr_model(**inputs)
 
-    results = image_processor.post_process_object_detection(
+    batch_results = image_processor.post_process_object_detection(
         outputs=outputs,
         threshold=threshold,
-        target_sizes=torch.tensor([image.size[::-1]]),
-    )[0]
+        target_sizes=torch.tensor([image.size[::-1] for image in images]),
+    )
 
-    results_size = len(results["labels"])
-    boxes = torch.zeros((results_size, 4), dtype=torch.float32)
-    labels = torch.zeros((results_size,), dtype=torch.int64)
-    scores = torch.zeros((results_size,), dtype=torch.float32)
+    # Model class id -> our class number, -1 for classes we do not report
+    class_numbers = torch.tensor(
+        [
+            get_class_number_rt_detr(rtdetr_model.config.id2label[i])
+            for i in range(len(rtdetr_model.config.id2label))
+        ]
+    )
+
+    processed = []
+    for results in batch_results:
+        labels = class_numbers[results["labels"]]
+        keep = labels != -1
+
+        processed.append(
+            {
+                "boxes": results["boxes"][keep],
+                "labels": labels[keep],
+                "scores": results["scores"][keep],
+            }
+        )
 
-    for idx, (score, label, box) in enumerate(
-        zip(results["scores"], results["labels"], results["boxes"])
-    ):
-        cls_id = get_class_number_rt_detr(rtdetr_model.config.id2label[label.item()])
-        if cls_id == -1:
-            continue
+    return processed
 
-        boxes[idx] = torch.tensor([int(i) for i in box.tolist()])
-        labels[idx] = cls_id
-        scores[idx] = round(score.item(), 3)
 
-    return {"boxes": boxes, "labels": labels, "scores": scores}
+def detect(images: list[Image.Image]) -> list[Detections]:
+    return [
+        Detections(boxes=results["boxes"], labels=results["labels"])
+        for results in process_image_rt_detr(images)
+    ]
 
 
 def get_class_number_rt_detr(name):
@@ -84,84 +123,3 @@ def get_class_number_rt_detr(name):
     if "Plastic" in name:
         return 3
     return -1
-
-
-def get_boxes_and_labels_rt_detr(image: Image.Image):
-    results = process_image_rt_detr(image)
-    boxes = results["boxes"]
-    original_labels = results["labels"]
-
-    final_labels = []
-
-    for i, box in enumerate(boxes):
-        try:
-            xmin, ymin, xmax, ymax = box.tolist()
-            cropped_image = image.crop((xmin, ymin, xmax, ymax))
-            buffer = io.BytesIO()
-            cropped_image.save(buffer, format="JPEG")
-            image_bytes = buffer.getvalue()
-            response = client.models.generate_content(
-                model="gemini-2.5-flash-preview-04-17",
-                contents=[
-                    types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
-                    "What type of trash is in the picture? Choose between: Paper, Plastic, Metal, Glass. Respond using only one word.",  # noqa:E501
-                ],
-            )
-
-            label = get_class_number_rt_detr(response.text)
-            if label == -1:
-                final_labels.append(
-                    original_labels[i].item()
-                    if isinstance(original_labels[i], torch.Tensor)
-                    else original_labels[i]
-                )
-            else:
-                final_labels.append(label)
-        except Exception:
-            final_labels.append(
-                original_labels[i].item()
-                if isinstance(original_labels[i], torch.Tensor)
-                else original_labels[i]
-            )
-
-    return {
-        "boxes": boxes,  # torch tensor  [xmin, ymin, xmax, ymax]
-        "labels": final_labels,  # list
-    }
-
-
-def get_bounding_boxes(image: Image.Image) -> list[BoundingBoxResponse]:
-    results = get_boxes_and_labels_rt_detr(image)
-    bounding_boxes = []
-
-    model_label_to_item_type = {
-        0: ItemType.paper,
-        1: ItemType.glass,
-        2: ItemType.metal,
-        3: ItemType.plastic,
-    }
-
-    boxes = results["boxes"]  # torch.Tensor of shape (N, 4)
-    labels = results["labels"]
-
-    for i in range(boxes.shape[0]):
-        box = boxes[i]
-        label = labels[i]
-        item_type = model_label_to_item_type.get(label, ItemType.unknown)
-
-        x_left = int(np.floor(box[0].item()))
-        y_top = int(np.floor(box[1].item()))
-        x_right = int(np.ceil(box[2].item()))
-        y_bottom = int(np.ceil(box[3].item()))
-
-        bounding_box = BoundingBoxResponse(
-            item_type=item_type,
-            x_left=x_left,
-            x_right=x_right,
-            y_top=y_top,
-            y_bottom=y_bottom,
-        )
-
-        bounding_boxes.append(bounding_box)
-
-    return bounding_boxes
@@ -0,0 +1,156 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.synchronize import Barrier
+from typing import TYPE_CHECKING, Callable, TypeVar
+
+import numpy as np
+from PIL import Image
+
+from core.config import settings
+
+if TYPE_CHECKING:
+    from core.detection.detection import Detections
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Shared memory block name and shape of a decoded RGB image
+SharedImage = tuple[str, tuple[int, ...]]
+
+# Set in worker processes, see `_wait_for_all_workers`
+_start_barrier: Barrier | None = None
+
+
+# Read by the native libraries when loaded, which happens before
+# `_init_worker` runs (e.g. numpy, imported to unpickle it). Workers get them
+# from the environment they are spawned with instead.
+_THREAD_VARIABLES = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def _init_worker(threads: int, start_barrier: Barrier) -> None:
+    global _start_barrier
+    _start_barrier = start_barrier
+
+    import torch
+
+    from core.detection.detection import get_detector
+
+    torch.set_num_threads(threads)
+    # ONNX Runtime uses all cores by default, per worker
+    settings.onnx_intra_op_threads = threads
+    get_detector().warm_up()
+
+
+def _detect(shared_images: list[SharedImage]) -> list["Detections"]:
+    from core.detection.detection import get_detector
+
+    images = []
+    for name, shape in shared_images:
+        # The parent process owns the block and unlinks it afterwards
+        shm = SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+        try:
+            pixels = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+        images.append(Image.fromarray(pixels))
+
+    return get_detector().detect(images)
+
+
+def _wait_for_all_workers() -> None:
+    """
+    Blocks until one such task runs in every worker, so that a task per worker
+    ensures that each has started (and ran `_init_worker`).
+    """
+    assert _start_barrier is not None
+    _start_barrier.wait()
+
+
+class DetectionWorkerPool:
+    """
+    Runs detection in separate worker processes, each holding its own copy of
+    the model and limited to `threads` compute threads.
+
+    Decoded images are handed over through shared memory, so the pixels are
+    not pickled through the pool's pipes.
+    """
+
+    def __init__(self, workers: int, threads: int):
+        self._workers = workers
+        self._threads = threads
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start all workers and wait until each has loaded the model."""
+        executor = self._get_executor()
+        tasks = [executor.submit(_wait_for_all_workers) for _ in range(self._workers)]
+        for future in tasks:
+            future.result()
+
+    def detect(self, images: list[Image.Image]) -> list["Detections"]:
+        blocks = []
+        try:
+            shared_images: list[SharedImage] = []
+            for image in images:
+                if image.mode != "RGB":
+                    image = image.convert("RGB")
+                pixels = np.asarray(image)
+                shm = SharedMemory(create=True, size=max(1, pixels.nbytes))
+                blocks.append(shm)
+                np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf)[:] = pixels
+                shared_images.append((shm.name, pixels.shape))
+
+            return self._run(_detect, shared_images)
+
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def _run(self, fn: Callable[..., T], *args) -> T:
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for running out of memory), after which
+            # the pool rejects all work. It is replaced and the call retried once.
+            logger.warning("Detection worker died, restarting the worker pool")
+            self._discard(executor)
+            return self._get_executor().submit(fn, *args).result()
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            # Concurrent calls may have already replaced it
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Inherited by the workers, which are spawned on first use. The
+                # API process itself does not run models when workers are used.
+                for variable in _THREAD_VARIABLES:
+                    os.environ[variable] = str(self._threads)
+
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self._threads, context.Barrier(self._workers)),
+                )
+            return self._executor
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+IMAGE_ROOT = Path("/image")
+IMAGE_URL_PREFIX = "/image"
+
+# Resized variants, by longest side in pixels, largest first
+VARIANTS = {
+    "medium": 1024,
+    "thumbnail": 256,
+}
+
+
+def derivative_key(image_key: str, variant: str) -> str:
+    return f"derivatives/{variant}/{image_key}.webp"
+
+
+def source_key(derivative_image_key: str) -> str:
+    """Inverse of `derivative_key`, given the part after the variant name."""
+    return derivative_image_key.removesuffix(".webp")
+
+
+def derivative_paths(image_path: str) -> dict[str, str]:
+    """Public paths of all variants of the image served at `image_path`."""
+    image_key = image_path.removeprefix(f"{IMAGE_URL_PREFIX}/")
+    return {
+        variant: f"{IMAGE_URL_PREFIX}/{derivative_key(image_key, variant)}"
+        for variant in VARIANTS
+    }
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from fastapi import HTTPException
+from PIL import Image
+
+# Magic bytes of the supported formats, as named by PIL
+_SIGNATURES = {
+    b"\xff\xd8\xff": "JPEG",
+    b"\x89PNG\r\n\x1a\n": "PNG",
+    b"GIF87a": "GIF",
+    b"GIF89a": "GIF",
+}
+
+SUPPORTED_FORMATS = sorted(set(_SIGNATURES.values()))
+
+
+def sniff_image_format(header: bytes) -> str | None:
+    """Returns the image format based on the first bytes of the file."""
+    for signature, image_format in _SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+    return None
+
+
+@dataclass
+class DecodedImage:
+    image: Image.Image  # RGB, fully loaded
+    original_size: tuple[int, int]  # Size of the encoded image, may be larger
+
+    @property
+    def scale(self) -> tuple[float, float]:
+        """Factors mapping coordinates in `image` to the original image."""
+        return (
+            self.original_size[0] / self.image.width,
+            self.original_size[1] / self.image.height,
+        )
+
+
+def decode_image(file: BinaryIO, min_size: int | None = None) -> DecodedImage:
+    """
+    Decodes an uploaded image once, into RGB, reading it from the start of
+    `file`.
+
+    If `min_size` is given, JPEGs are decoded at the smallest DCT scale that
+    still has both sides at least `min_size` pixels long, which is much faster
+    and needs less memory for large photos.
+    """
+    file.seek(0)
+    image_format = sniff_image_format(file.read(16))
+    if image_format is None:
+        raise HTTPException(400, "Uploaded file is not a valid image.")
+
+    try:
+        file.seek(0)
+        image = Image.open(file, formats=[image_format])
+        original_size = image.size
+
+        if min_size is not None and image_format == "JPEG":
+            image.draft("RGB", (min_size, min_size))
+
+        image.load()
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+    except Exception:
+        raise HTTPException(400, "Uploaded file is not a valid image.")
+
+    return DecodedImage(image=image, original_size=original_size)
+
+
+def read_image_size(path: Path) -> tuple[int, int]:
+    """
+    Checks that the file is a valid image of a supported format and returns its
+    size, without decoding the pixel data.
+    """
+    try:
+        with Image.open(path, formats=SUPPORTED_FORMATS) as image:
+            size = image.size
+            image.verify()
+    except Exception:
+        raise HTTPException(400, "Invalid or corrupted image")
+
+    return size
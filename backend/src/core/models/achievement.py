@@ -1,11 +1,15 @@
 from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Self
 
 if TYPE_CHECKING:
     from core.models.user import User
 
+from pydantic import model_validator
 from sqlmodel import Field, Relationship, SQLModel
 
+from core.models.enums import AchievementMetric
+from core.models.item import ItemType
+
 
 class AchievementUserLink(SQLModel, table=True):  # type: ignore
     achievement_id: int | None = Field(
@@ -19,6 +23,22 @@ class AchievementBase(SQLModel):
     name: str
     description: str
 
+    # Unlocked automatically once the user's `rule_metric` counter, restricted
+    # to items of `rule_item_type` if set, reaches `rule_threshold`
+    rule_metric: AchievementMetric | None = None
+    rule_item_type: ItemType | None = None
+    rule_threshold: int | None = Field(default=None, ge=1)
+
+    @model_validator(mode="after")
+    def check_rule(self) -> Self:
+        if (self.rule_metric is None) != (self.rule_threshold is None):
+            raise ValueError("rule_metric and rule_threshold must be set together")
+
+        if self.rule_item_type is not None and self.rule_metric is None:
+            raise ValueError("rule_item_type requires rule_metric")
+
+        return self
+
 
 class AchievementRequest(AchievementBase):
     pass
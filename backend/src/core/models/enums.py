@@ -2,4 +2,17 @@ from enum import Enum
 
 
 class ItemOrder(str, Enum):
+    """Sort orders of item listings, each backed by an index (see `Item`)."""
+
     id = "id"
+    newest = "newest"  # By upload time
+    oldest = "oldest"
+    created_newest = "created_newest"  # By the time the photo was taken
+    created_oldest = "created_oldest"
+
+
+class AchievementMetric(str, Enum):
+    """Per-user counters that achievements can be unlocked by."""
+
+    items_reported = "items_reported"
+    items_collected = "items_collected"
@@ -1,13 +1,17 @@
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 from typing import Self
 
-from fastapi import UploadFile
+from fastapi import Query, UploadFile
 from geoalchemy2 import Geography, WKTElement
 from pydantic import ConfigDict, model_validator
+from sqlalchemy import func
 from sqlmodel import Column, Field, Index, Relationship, SQLModel
 
+from core.image_paths import derivative_paths
 from core.models.message import Message
+from core.models.types import NaiveUTCDatetime
 
 
 class ItemType(str, Enum):
@@ -66,9 +70,9 @@ class BoundingBox(BoundingBoxBase, table=True):  # type: ignore
 
 class ItemBase(SQLModel):
     user_id: str
-    created_at: datetime = Field(index=True)
-    latitude: float = Field(ge=-90, le=90, index=True)
-    longitude: float = Field(ge=-180, le=180, index=True)
+    created_at: NaiveUTCDatetime
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
 
 
 class ItemCreate(ItemBase):
@@ -81,6 +85,7 @@ class ItemCreate(ItemBase):
 class ItemResponse(ItemBase):
     id: int
     image_path: str
+    image_variants: dict[str, str]  # Variant name (e.g. thumbnail) -> path
     uploaded_at: datetime
     bounding_boxes: list[BoundingBoxResponse]
 
@@ -89,10 +94,51 @@ class ItemResponse(ItemBase):
     collected_timestamp: datetime | None
 
 
+@dataclass
+class ItemFilters:
+    """
+    Filters shared by item search and aggregation endpoints, used as a
+    dependency so that they are read from query parameters.
+    """
+
+    author_id: str | None = None
+
+    created_before: NaiveUTCDatetime | None = None
+    created_after: NaiveUTCDatetime | None = None
+
+    uploaded_before: NaiveUTCDatetime | None = None
+    uploaded_after: NaiveUTCDatetime | None = None
+
+    # If longitude_min > longitude_max, the range crosses the 180/-180 line
+    latitude_min: float | None = Query(ge=-90, le=90, default=None)
+    latitude_max: float | None = Query(ge=-90, le=90, default=None)
+
+    longitude_min: float | None = Query(ge=-180, le=180, default=None)
+    longitude_max: float | None = Query(ge=-180, le=180, default=None)
+
+    nearby_center_latitude: float | None = Query(ge=-90, le=90, default=None)
+    nearby_center_longitude: float | None = Query(ge=-180, le=180, default=None)
+    nearby_radius_meters: float | None = None
+
+    contains_item_type: ItemType | None = None
+
+    collected: bool | None = None
+    collected_by: str | None = None
+    collected_before: NaiveUTCDatetime | None = None
+    collected_after: NaiveUTCDatetime | None = None
+
+
+class ItemClusterResponse(SQLModel):
+    latitude: float  # Mean position of the items in the cluster
+    longitude: float
+    count: int
+    item_id: int | None  # Set if the cluster is a single item
+
+
 class Item(ItemBase, table=True):  # type: ignore
     id: int | None = Field(default=None, primary_key=True)
     image_path: str
-    uploaded_at: datetime = Field(index=True)
+    uploaded_at: datetime
     bounding_boxes: list[BoundingBox] = Relationship(back_populates="item")
 
     collected: bool = False
@@ -100,7 +146,9 @@ class Item(ItemBase, table=True):  # type: ignore
     collected_timestamp: datetime | None = None
 
     location: WKTElement = Field(
-        sa_column=Column(Geography(geometry_type="POINT", srid=4326))
+        sa_column=Column(
+            Geography(geometry_type="POINT", srid=4326, spatial_index=False)
+        )
     )
 
     messages: list[Message] = Relationship(back_populates="item")
@@ -111,7 +159,22 @@ class Item(ItemBase, table=True):  # type: ignore
     def into_response(self) -> ItemResponse:
         return ItemResponse(
             **self.model_dump(),
+            image_variants=derivative_paths(self.image_path),
             bounding_boxes=[bb.into_response() for bb in self.bounding_boxes],
         )
 
-    __table_args__ = (Index("idx_item_latitude_longitude", "latitude", "longitude"),)
+    __table_args__ = (
+        # Radius search (ST_DWithin on geography)
+        Index("idx_item_location", "location", postgresql_using="gist"),
+        # Keyset pagination, see ItemOrder. Also used for range filters.
+        Index("idx_item_uploaded_at_id", "uploaded_at", "id"),
+        Index("idx_item_created_at_id", "created_at", "id"),
+    )
+
+
+# Planar view of `Item.location`, for latitude / longitude box queries, which
+# are not great-circle shapes. Queries must use this exact expression for the
+# index below to apply.
+item_geometry = func.geometry(Item.location)
+
+Index("idx_item_location_geometry", item_geometry, postgresql_using="gist")
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from sqlmodel import Field, SQLModel
+
+from core.models.item import ItemType
+
+
+class UserStatsBase(SQLModel):
+    items_reported: int = 0
+    items_collected: int = 0
+    first_activity_at: datetime | None = None
+    last_activity_at: datetime | None = None
+
+
+class UserItemTypeStatsResponse(SQLModel):
+    item_type: ItemType
+    items_reported: int
+    items_collected: int
+
+
+class UserStatsResponse(UserStatsBase):
+    user_id: str
+    item_types: list[UserItemTypeStatsResponse]
+
+
+class UserStats(UserStatsBase, table=True):  # type: ignore
+    """
+    Counters of a user's activity, kept up to date with item changes (see
+    core.achievements). Users are not required to exist in the `user` table.
+    """
+
+    user_id: str = Field(primary_key=True)
+
+
+class UserItemTypeStats(SQLModel, table=True):  # type: ignore
+    """Items of a given type a user has reported or collected."""
+
+    user_id: str = Field(primary_key=True)
+    item_type: ItemType = Field(primary_key=True)
+    items_reported: int = 0
+    items_collected: int = 0
+
+    def into_response(self) -> UserItemTypeStatsResponse:
+        return UserItemTypeStatsResponse(**self.model_dump())
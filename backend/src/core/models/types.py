@@ -0,0 +1,19 @@
+from datetime import UTC, datetime
+from typing import Annotated
+
+from pydantic import AfterValidator
+
+
+def as_naive_utc(value: datetime) -> datetime:
+    """
+    Converts timezone-aware datetimes to naive UTC, as stored in the database
+    (asyncpg rejects aware values for `timestamp without time zone` columns).
+    Naive datetimes are assumed to already be in UTC.
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(UTC).replace(tzinfo=None)
+
+
+# Timestamp sent by a client, possibly with a timezone (e.g. "...Z")
+NaiveUTCDatetime = Annotated[datetime, AfterValidator(as_naive_utc)]
@@ -23,16 +23,16 @@ class User(UserBase, table=True):  # type: ignore
         return UserResponse(**self.model_dump())
 
 
-def ensure_user(user_id, session: SessionDep) -> User:
+async def ensure_user(user_id, session: SessionDep) -> User:
     """
     Get an existing user or create a new user with given id
     """
-    if user := session.get(User, user_id):
+    if user := await session.get(User, user_id):
         return user
     else:
         user = User(id=user_id)
         saved_user = User.model_validate(user)
         session.add(saved_user)
-        session.commit()
-        session.refresh(saved_user)
+        await session.commit()
+        await session.refresh(saved_user)
         return saved_user
@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException
+
+
+def encode_cursor(order: str, values: list[Any]) -> str:
+    """
+    Encodes the sort key of the last returned row into an opaque cursor.
+    Datetimes are stored as ISO strings.
+    """
+    payload = [
+        order,
+        [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in values
+        ],
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order: str, types: list[type]) -> list[Any]:
+    """
+    Inverse of `encode_cursor`. Raises 400 if the cursor is malformed or was
+    issued for a different sort order.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_order, values = json.loads(base64.urlsafe_b64decode(padded))
+
+        if cursor_order != order or len(values) != len(types):
+            raise ValueError
+
+        return [
+            (
+                datetime.fromisoformat(value)
+                if value_type is datetime
+                else value_type(value)
+            )
+            for value, value_type in zip(values, types)
+        ]
+
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
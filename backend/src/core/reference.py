@@ -0,0 +1,183 @@
+"""
+In-process caches of small, rarely changing tables (reference data).
+
+Each `ReferenceCache` keeps the rows serialized to JSON, so requests are
+served without touching the database or re-encoding. Writes invalidate the
+cache locally and, through Postgres NOTIFY, in all other workers, which run a
+`ReferenceListener`.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Generic, Hashable, Sequence, TypeVar
+
+import asyncpg  # type: ignore
+from pydantic import BaseModel
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.db import engine
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "reference_data"
+RECONNECT_SECONDS = 5
+
+M = TypeVar("M", bound=BaseModel)
+
+
+@dataclass
+class Serialized:
+    body: bytes  # JSON
+    etag: str
+
+    @staticmethod
+    def of(body: bytes) -> "Serialized":
+        return Serialized(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+@dataclass
+class ReferenceSnapshot:
+    generation: int
+    loaded_at: float
+    all: Serialized  # List of all rows
+    by_key: dict[Hashable, Serialized]
+
+
+_caches: dict[str, "ReferenceCache"] = {}
+
+
+class ReferenceCache(Generic[M]):
+    """
+    Read-through cache of a whole table, loaded by `load` as response models.
+
+    Every invalidation bumps the generation. A snapshot is only used while the
+    generation it was loaded in is current, so a load racing with a write is
+    never kept. `ttl_seconds` bounds staleness should a notification be lost.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        load: Callable[[AsyncSession], Awaitable[Sequence[M]]],
+        key: Callable[[M], Hashable],
+        ttl_seconds: float,
+    ):
+        self.name = name
+        self._load = load
+        self._key = key
+        self._ttl_seconds = ttl_seconds
+        self._generation = 0
+        self._snapshot: ReferenceSnapshot | None = None
+        self._lock = asyncio.Lock()
+        _caches[name] = self
+
+    async def get(self, session: AsyncSession) -> ReferenceSnapshot:
+        if (snapshot := self._current()) is not None:
+            return snapshot
+
+        async with self._lock:
+            if (snapshot := self._current()) is not None:
+                return snapshot
+
+            generation = self._generation
+            rows = {
+                self._key(row): row.model_dump_json().encode()
+                for row in await self._load(session)
+            }
+            snapshot = ReferenceSnapshot(
+                generation=generation,
+                loaded_at=time.monotonic(),
+                all=Serialized.of(b"[" + b",".join(rows.values()) + b"]"),
+                by_key={key: Serialized.of(body) for key, body in rows.items()},
+            )
+            if generation == self._generation:
+                self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._snapshot = None
+
+    async def notify_changed(self, session: AsyncSession) -> None:
+        """
+        Invalidates the cache in all workers once `session` commits. Call
+        `invalidate` after the commit for this worker to see the change at once.
+        """
+        await session.exec(select(func.pg_notify(CHANNEL, self.name)))
+
+    def _current(self) -> ReferenceSnapshot | None:
+        snapshot = self._snapshot
+        if (
+            snapshot is not None
+            and snapshot.generation == self._generation
+            and time.monotonic() - snapshot.loaded_at < self._ttl_seconds
+        ):
+            return snapshot
+        return None
+
+
+def _invalidate_all() -> None:
+    for cache in _caches.values():
+        cache.invalidate()
+
+
+def _on_notification(connection, pid: int, channel: str, name: str) -> None:
+    if (cache := _caches.get(name)) is not None:
+        cache.invalidate()
+
+
+class ReferenceListener:
+    """
+    Invalidates caches named in notifications on `CHANNEL`, using a dedicated
+    connection outside the pool. Notifications sent while disconnected are
+    lost, so all caches are invalidated whenever it (re)connects.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        dsn = engine.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        while True:
+            try:
+                await self._listen(dsn)
+            except (OSError, asyncpg.PostgresError) as error:
+                logger.warning("Reference data listener disconnected: %s", error)
+            except Exception:
+                # Anything else must not end the task, which would silently
+                # stop invalidation in this worker until a restart
+                logger.exception("Reference data listener failed")
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def _listen(self, dsn: str) -> None:
+        connection = await asyncpg.connect(dsn)
+        try:
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            await connection.add_listener(CHANNEL, _on_notification)
+            _invalidate_all()
+            await lost.wait()
+        finally:
+            await connection.close()
+
+
+reference_listener = ReferenceListener()
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Iterator, Protocol
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.image_paths import VARIANTS, derivative_key
+from core.models.item import Item
+
+IMAGE_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif"}
+
+
+class ImageStorage(Protocol):
+    """
+    Content-addressed image storage.
+
+    Images are stored under a key derived from their SHA-256, so identical
+    uploads share a single blob.
+    """
+
+    def put(self, source: Path, sha256: str, image_format: str) -> str:
+        """
+        Moves the file at `source` into storage and returns its key. If an
+        identical image is already stored, `source` is removed instead.
+        """
+        ...
+
+    def public_path(self, key: str) -> str:
+        """Path under which the image is served, stored in `Item.image_path`."""
+        ...
+
+    def key_from_public_path(self, public_path: str) -> str | None:
+        """Inverse of `public_path`, None for images stored some other way."""
+        ...
+
+    def delete(self, key: str) -> None:
+        """Remove the image and its resized variants, if present."""
+        ...
+
+    def keys(self, older_than_seconds: float = 0) -> Iterator[str]:
+        """Keys of all stored images not modified in the last given seconds."""
+        ...
+
+
+class LocalImageStorage:
+    """
+    Stores images as `<root>/ab/cd/abcd...ef.<ext>`, where `abcd...ef` is the
+    SHA-256 of the image, so that no single directory grows too large.
+    """
+
+    def __init__(self, root: Path, url_prefix: str = "/image"):
+        self.root = root
+        self.url_prefix = url_prefix
+
+    def put(self, source: Path, sha256: str, image_format: str) -> str:
+        key = f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{IMAGE_EXTENSIONS[image_format]}"
+        target = self.root / key
+
+        if target.exists():
+            source.unlink(missing_ok=True)
+            # Refresh mtime so that the blob is not collected as an orphan
+            # before the item referencing it is committed
+            target.touch()
+            return key
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+        return key
+
+    def public_path(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def key_from_public_path(self, public_path: str) -> str | None:
+        prefix = f"{self.url_prefix}/"
+        return public_path[len(prefix) :] if public_path.startswith(prefix) else None
+
+    def delete(self, key: str) -> None:
+        (self.root / key).unlink(missing_ok=True)
+        for variant in VARIANTS:
+            (self.root / derivative_key(key, variant)).unlink(missing_ok=True)
+
+    def keys(self, older_than_seconds: float = 0) -> Iterator[str]:
+        now = time.time()
+        for path in self.root.glob("[0-9a-f][0-9a-f]/[0-9a-f][0-9a-f]/*"):
+            if now - path.stat().st_mtime >= older_than_seconds:
+                yield path.relative_to(self.root).as_posix()
+
+
+image_storage: ImageStorage = LocalImageStorage(Path("/image"))
+
+
+async def collect_orphans(
+    session: AsyncSession, storage: ImageStorage, grace_seconds: float = 60 * 60
+) -> int:
+    """
+    Delete stored images that no item references. Images stored in the last
+    `grace_seconds` are kept, as their items may not be committed yet.
+    Returns the number of deleted images.
+    """
+    image_paths = await session.exec(select(Item.image_path).distinct())
+    referenced = {
+        storage.key_from_public_path(image_path) for image_path in image_paths.all()
+    }
+
+    deleted = 0
+    for key in list(storage.keys(older_than_seconds=grace_seconds)):
+        if key not in referenced:
+            storage.delete(key)
+            deleted += 1
+
+    return deleted
+
+
+async def _main():
+    from core.db import engine, session_factory
+
+    async with session_factory() as session:
+        deleted = await collect_orphans(session, image_storage)
+    await engine.dispose()
+
+    print(f"Deleted {deleted} orphaned images")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
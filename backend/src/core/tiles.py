@@ -0,0 +1,45 @@
+import threading
+from typing import Hashable
+
+from core.cache import CacheStats, LRUCache
+from core.config import settings
+
+TILE_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+TILE_EXTENT = 4096  # Tile coordinate resolution, the MVT default
+
+
+class TileCache:
+    """
+    Encoded vector tiles by coordinates and filters.
+
+    Changing an item bumps the generation, which is part of every key, so all
+    earlier tiles become unreachable, including those still being rendered
+    while the change happened. Only affects this worker; tiles cached by other
+    workers expire after `ttl_seconds`.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._cache: LRUCache[Hashable, bytes] = LRUCache(max_size, ttl_seconds)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def key(self, *parts: Hashable) -> Hashable:
+        """Key for a tile, to be taken before rendering it."""
+        return (self._generation, *parts)
+
+    def get(self, key: Hashable) -> bytes | None:
+        return self._cache.get(key)
+
+    def set(self, key: Hashable, tile: bytes) -> None:
+        self._cache.set(key, tile)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+        self._cache.clear()
+
+    def stats(self) -> CacheStats:
+        return self._cache.stats()
+
+
+tile_cache = TileCache(settings.tile_cache_size, settings.tile_cache_ttl_seconds)
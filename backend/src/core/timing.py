@@ -0,0 +1,22 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Collects wall-clock durations of named processing stages."""
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+
+    def server_timing(self) -> str:
+        """Value for the `Server-Timing` response header."""
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.stages.items())
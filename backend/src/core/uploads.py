@@ -0,0 +1,99 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from tempfile import mkstemp
+from typing import AsyncIterator
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+
+from core.config import settings
+from core.images import sniff_image_format
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Stored images are sent by nginx as another user, while mkstemp creates 0600 files
+STORED_FILE_MODE = 0o644
+
+
+@dataclass
+class Upload:
+    sha256: str
+    size: int
+    image_format: str
+
+
+async def _stream(file: UploadFile, upload: Upload) -> AsyncIterator[bytes]:
+    """
+    Yields the upload in chunks while updating `upload` with its hash, size and
+    format. Aborts as soon as the file turns out not to be an image or to be
+    larger than `max_file_size`.
+    """
+    digest = hashlib.sha256()
+
+    while chunk := await file.read(CHUNK_SIZE):
+        if upload.size == 0:
+            image_format = sniff_image_format(chunk[:16])
+            if image_format is None:
+                raise HTTPException(400, "Uploaded file is not a valid image.")
+            upload.image_format = image_format
+
+        upload.size += len(chunk)
+        if upload.size > settings.max_file_size:
+            raise HTTPException(
+                400,
+                f"File too large. Maximum file size is {settings.max_file_size}",
+            )
+
+        digest.update(chunk)
+        yield chunk
+
+    if upload.size == 0:
+        raise HTTPException(400, "Uploaded file is empty.")
+
+    upload.sha256 = digest.hexdigest()
+
+
+async def inspect_upload(file: UploadFile) -> Upload:
+    """
+    Validates an image upload and hashes it, enforcing `max_file_size`, without
+    keeping a copy. The file is rewound, so that it can be read again from
+    `file.file`, which Starlette spools to disk if it is large.
+    """
+    upload = Upload(sha256="", size=0, image_format="")
+
+    async for _ in _stream(file, upload):
+        pass
+
+    await file.seek(0)
+    return upload
+
+
+async def save_upload(file: UploadFile, path: Path) -> Upload:
+    """
+    Streams an image upload to `path`, enforcing `max_file_size`.
+
+    The file is written to a temporary file next to `path` and only renamed to
+    `path` once it was fully received, so `path` never holds a partial upload.
+    """
+    upload = Upload(sha256="", size=0, image_format="")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = mkstemp(dir=path.parent, prefix=".upload-")
+    os.fchmod(fd, STORED_FILE_MODE)
+    os.close(fd)
+
+    try:
+        async with aiofiles.open(tmp_name, "wb") as f:
+            async for chunk in _stream(file, upload):
+                await f.write(chunk)
+
+        os.replace(tmp_name, path)
+
+    except BaseException:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+        raise
+
+    return upload
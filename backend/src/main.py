@@ -1,16 +1,31 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
-from api import api
+from api import api, images
+from api.middleware import FORM_OVERHEAD, BodySizeLimitMiddleware
 from core.config import settings
-from core.db import setup_db
+from core.db import engine, setup_db
+from core.detection.detection import shutdown_detector, warm_up_detector
+from core.reference import reference_listener
 
-setup_db()
 
-app = FastAPI(title=settings.project_name)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await setup_db()
+    reference_listener.start()
+    if settings.detection_warm_up:
+        await run_in_threadpool(warm_up_detector)
+    yield
+    await reference_listener.stop()
+    await shutdown_detector()
+    await engine.dispose()
+
+
+app = FastAPI(title=settings.project_name, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,9 +33,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Next-Cursor"],
+)
+
+app.add_middleware(
+    BodySizeLimitMiddleware, max_size=settings.max_file_size + FORM_OVERHEAD
 )
 
 Path("/image").mkdir(parents=True, exist_ok=True)
-app.mount("/image", StaticFiles(directory="/image"), name="image")
+app.include_router(images.router)
 
 app.include_router(api.router)
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from core import auth as auth_module
+from core.auth import UnauthorizedException, VerifyUserID
+from core.config import settings
+
+_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def _jwks(kid: str = "key-1") -> dict:
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(_private_key.public_key()))
+    return {"keys": [{**jwk, "kid": kid, "use": "sig", "alg": "RS256"}]}
+
+
+def _token(kid: str = "key-1", expires_in: float = 3600) -> str:
+    payload = {
+        "sub": "user",
+        "aud": settings.auth0_api_audience,
+        "iss": settings.auth0_issuer,
+        "exp": time.time() + expires_in,
+    }
+    return jwt.encode(payload, _private_key, algorithm="RS256", headers={"kid": kid})
+
+
+class _JWKSStandIn:
+    """Serves the key set in place of the JWKS URL, counting fetches."""
+
+    def __init__(self):
+        self.data = _jwks()
+        self.fetches = 0
+
+    def fetch_data(self) -> dict:
+        self.fetches += 1
+        return self.data
+
+
+@pytest.fixture
+def jwks():
+    return _JWKSStandIn()
+
+
+@pytest.fixture
+def verifier(jwks, monkeypatch):
+    monkeypatch.setattr(settings, "auth_jwks_refresh_seconds", 3600)
+    monkeypatch.setattr(settings, "auth_jwks_min_refetch_seconds", 30)
+    verifier = VerifyUserID()
+    monkeypatch.setattr(verifier.jwks._client, "fetch_data", jwks.fetch_data)
+    return verifier
+
+
+def test_verified_token_is_served_from_cache(verifier, monkeypatch):
+    token = _token()
+    decode_calls = 0
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        nonlocal decode_calls
+        decode_calls += 1
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth_module.jwt, "decode", counting_decode)
+
+    async def verify_twice():
+        return [await verifier._verify(token) for _ in range(2)]
+
+    first, second = asyncio.run(verify_twice())
+
+    assert first["sub"] == second["sub"] == "user"
+    assert decode_calls == 1
+
+
+def test_expired_token_is_not_served_from_cache(verifier):
+    token = _token(expires_in=1)
+
+    async def verify_after_expiry():
+        await verifier._verify(token)
+        await asyncio.sleep(1.1)
+        await verifier._verify(token)
+
+    with pytest.raises(UnauthorizedException, match="expired"):
+        asyncio.run(verify_after_expiry())
+
+
+def test_unknown_key_refetches_at_most_once_per_interval(verifier, jwks):
+    async def verify(token: str) -> bool:
+        try:
+            await verifier._verify(token)
+            return True
+        except UnauthorizedException:
+            return False
+
+    async def run():
+        assert await verify(_token())
+        assert jwks.fetches == 1
+
+        # Right after a fetch, unknown keys are rejected without refetching
+        assert not await verify(_token(kid="key-2"))
+        assert not await verify(_token(kid="key-2"))
+        assert jwks.fetches == 1
+
+        # The signing key was rotated
+        jwks.data = _jwks(kid="key-2")
+        verifier.jwks._fetch_started_at -= settings.auth_jwks_min_refetch_seconds + 1
+        assert await verify(_token(kid="key-2"))
+        assert not await verify(_token(kid="key-3"))
+        assert jwks.fetches == 2
+
+    asyncio.run(run())
+
+
+def test_invalid_key_set_is_rejected(verifier, jwks):
+    jwks.data = {"keys": []}
+
+    with pytest.raises(UnauthorizedException):
+        asyncio.run(verifier._verify(_token()))
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from core.detection.batching import BatchScheduler
+
+
+def _scheduler(run_batch, **options) -> BatchScheduler[int, int]:
+    options = {
+        "max_batch_size": 4,
+        "max_wait_ms": 50,
+        "max_queue_size": 100,
+        **options,
+    }
+    return BatchScheduler(run_batch, **options)
+
+
+def test_concurrent_submissions_are_batched():
+    batches: list[list[int]] = []
+
+    def run_batch(items: list[int]) -> list[int]:
+        batches.append(items)
+        return [item * 10 for item in items]
+
+    scheduler = _scheduler(run_batch, max_wait_ms=1000)
+
+    async def submit_all():
+        results = await asyncio.gather(*(scheduler.submit(i) for i in range(10)))
+        await scheduler.close()
+        return results
+
+    assert asyncio.run(submit_all()) == [i * 10 for i in range(10)]
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert scheduler.stats().largest_batch == 4
+
+
+def test_lone_submission_is_dispatched_after_max_wait():
+    scheduler = _scheduler(lambda items: items, max_wait_ms=100)
+
+    async def submit():
+        start = time.monotonic()
+        result = await scheduler.submit(1)
+        await scheduler.close()
+        return result, time.monotonic() - start
+
+    result, elapsed = asyncio.run(submit())
+
+    assert result == 1
+    assert 0.08 <= elapsed < 1
+
+
+def test_full_queue_rejects_submissions():
+    started, release = threading.Event(), threading.Event()
+
+    def run_batch(items: list[int]) -> list[int]:
+        started.set()
+        release.wait(timeout=5)
+        return items
+
+    scheduler = _scheduler(run_batch, max_batch_size=1, max_queue_size=2)
+
+    async def submit_all():
+        # The first one is taken off the queue and occupies the only batch slot
+        running = asyncio.create_task(scheduler.submit(0))
+        await asyncio.to_thread(started.wait, 5)
+        queued = [asyncio.create_task(scheduler.submit(i)) for i in (1, 2)]
+        await asyncio.sleep(0)
+
+        try:
+            with pytest.raises(HTTPException) as error:
+                await scheduler.submit(3)
+        finally:
+            release.set()
+
+        results = await asyncio.gather(running, *queued)
+        await scheduler.close()
+        return error.value.status_code, results
+
+    status_code, results = asyncio.run(submit_all())
+
+    assert status_code == 429
+    assert results == [0, 1, 2]
+    assert scheduler.stats().rejected == 1
+
+
+def test_batch_failure_reaches_every_waiter():
+    def run_batch(items: list[int]) -> list[int]:
+        raise RuntimeError("model crashed")
+
+    scheduler = _scheduler(run_batch)
+
+    async def submit_all():
+        results = await asyncio.gather(
+            *(scheduler.submit(i) for i in range(3)), return_exceptions=True
+        )
+        await scheduler.close()
+        return results
+
+    results = asyncio.run(submit_all())
+
+    assert len(results) == 3
+    assert all(
+        isinstance(error, RuntimeError) and str(error) == "model crashed"
+        for error in results
+    )
@@ -0,0 +1,40 @@
+import asyncio
+
+from core.cache import CoalescingCache, LRUCache
+from core.detection.registry import ModelRegistry
+
+
+def test_registry_reloads_changed_model():
+    registry = ModelRegistry()
+    loads = []
+
+    def load():
+        loads.append(object())
+        return loads[-1]
+
+    first = registry.get("model", load, version="1")
+    assert registry.get("model", load, version="1") is first
+
+    second = registry.get("model", load, version="2")
+    assert second is not first
+    assert registry.get("model", load, version="2") is second
+    assert registry.stats()["model"].load_count == 2
+
+
+def test_coalescing_cache_uses_ttl_of_value(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("core.cache.time.time", lambda: now)
+    cache = CoalescingCache(
+        LRUCache(max_size=10, ttl_seconds=3600),
+        ttl_seconds=lambda value: 30 if value == "degraded" else None,
+    )
+
+    async def compute(value):
+        return value
+
+    asyncio.run(cache.get_or_compute("full", lambda: compute("full")))
+    asyncio.run(cache.get_or_compute("partial", lambda: compute("degraded")))
+
+    now += 60
+    assert asyncio.run(cache.get_or_compute("full", lambda: compute("new"))) == "full"
+    assert asyncio.run(cache.get_or_compute("partial", lambda: compute("new"))) == "new"
@@ -0,0 +1,35 @@
+import threading
+
+from PIL import Image
+
+from core import derivatives
+from core.config import settings
+from core.image_paths import derivative_key
+
+
+def test_derivatives_apply_exif_orientation(tmp_path, monkeypatch):
+    monkeypatch.setattr(derivatives, "IMAGE_ROOT", tmp_path)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotated by 90 degrees
+    Image.new("RGB", (64, 48)).save(tmp_path / "image.jpg", exif=exif)
+
+    derivatives.generate_derivatives("image.jpg")
+
+    with Image.open(tmp_path / derivative_key("image.jpg", "thumbnail")) as image:
+        assert image.size == (48, 64)
+
+
+def test_schedule_derivatives_is_bounded(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(derivatives, "generate_derivatives", lambda _: release.wait())
+    monkeypatch.setattr(settings, "derivative_max_queue_size", 2)
+
+    try:
+        first = derivatives.schedule_derivatives("first.png")
+        assert derivatives.schedule_derivatives("first.png") is first
+        assert derivatives.schedule_derivatives("second.png") is not None
+        assert derivatives.schedule_derivatives("third.png") is None
+    finally:
+        release.set()
+
+    first.result()
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("ultralytics")
+torchvision = pytest.importorskip("torchvision")
+
+from core.config import settings  # noqa: E402
+from core.detection import onnx_yolo, yolo  # noqa: E402
+
+# Photos of litter, which the model is expected to find boxes on
+LITTER_PHOTOS = sorted((Path(__file__).parent / "images").glob("litter-*.jpg"))
+
+# Boxes of both backends differ slightly, as ultralytics pads images differently
+MIN_IOU = 0.9
+
+
+@pytest.mark.skipif(
+    not Path(yolo.model_path).exists(), reason="YOLO weights are not available"
+)
+@pytest.mark.skipif(
+    not LITTER_PHOTOS, reason="No backend/tests/images/litter-*.jpg photos"
+)
+def test_onnx_boxes_match_ultralytics(monkeypatch):
+    monkeypatch.setattr(settings, "onnx_quantize", False)
+    images = [Image.open(path).convert("RGB") for path in LITTER_PHOTOS]
+
+    for expected, actual in zip(yolo.detect(images), onnx_yolo.detect(images)):
+        assert len(expected.boxes) > 0
+        # Boxes scored close to the confidence threshold may end up on either side
+        assert abs(len(actual.boxes) - len(expected.boxes)) <= 1
+
+        iou = torchvision.ops.box_iou(expected.boxes, actual.boxes)
+        same_label = expected.labels[:, None] == actual.labels[None, :]
+        matched = ((iou >= MIN_IOU) & same_label).any(dim=1)
+        assert matched.sum() >= len(expected.boxes) - 1
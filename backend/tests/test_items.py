@@ -0,0 +1,181 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlmodel import select
+
+from api.endpoints.item import _bounds_filter
+from core.models.enums import ItemOrder
+from core.models.item import Item, ItemBase
+
+
+def test_timestamps_with_timezone_are_stored_as_naive_utc():
+    item = ItemBase(
+        user_id="user",
+        created_at="2025-01-01T12:00:00+02:00",
+        latitude=0,
+        longitude=0,
+    )
+
+    assert item.created_at == datetime(2025, 1, 1, 10)
+
+
+def test_search_accepts_timestamps_with_timezone(client, add_item):
+    item_id = add_item(created_at=datetime(2025, 1, 1, 12))
+
+    response = client.get(
+        "/api/v1/items/",
+        params={
+            "created_after": "2025-01-01T11:00:00Z",
+            "created_before": "2025-01-01T13:30:00+01:00",
+            "uploaded_before": "2025-01-02T00:00:00Z",
+        },
+    )
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [item_id]
+
+    response = client.get(
+        "/api/v1/items/", params={"created_before": "2025-01-01T13:00:00+02:00"}
+    )
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def _walk_pages(client, order: ItemOrder, limit: int, count: int) -> list[int]:
+    """
+    Ids of all `count` items in `order`, following X-Next-Cursor page by page.
+    """
+    ids: list[int] = []
+    params = {"order": order.value, "limit": limit}
+
+    # Bounded, as a cursor that does not advance would repeat pages forever
+    while len(ids) <= count:
+        response = client.get("/api/v1/items/", params=params)
+        assert response.status_code == 200
+        page = [item["id"] for item in response.json()]
+        assert 0 < len(page) <= limit
+        ids += page
+
+        if "X-Next-Cursor" not in response.headers:
+            return ids
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    raise AssertionError(f"More than {count} items returned: {ids}")
+
+
+@pytest.mark.parametrize("order", list(ItemOrder))
+def test_search_pages_cover_every_item_once(client, add_item, order):
+    # Few distinct timestamps, so that pages end within runs of ties
+    uploaded = [datetime(2025, 1, day, 12, 0, 0, 123456) for day in (1, 2, 3)]
+    created = [datetime(2024, 6, day) for day in (1, 2)]
+    items = {}
+    for i in range(11):
+        fields = {"uploaded_at": uploaded[i % 3], "created_at": created[i % 2]}
+        items[add_item(**fields)] = fields
+
+    column, descending = {
+        ItemOrder.id: (None, False),
+        ItemOrder.newest: ("uploaded_at", True),
+        ItemOrder.oldest: ("uploaded_at", False),
+        ItemOrder.created_newest: ("created_at", True),
+        ItemOrder.created_oldest: ("created_at", False),
+    }[order]
+    expected = sorted(
+        items,
+        key=lambda item_id: (items[item_id][column], item_id) if column else item_id,
+        reverse=descending,
+    )
+
+    for limit in (1, 2, 4):
+        assert _walk_pages(client, order, limit, len(items)) == expected
+
+
+def test_search_rejects_cursor_of_other_order(client, add_item):
+    for _ in range(3):
+        add_item()
+
+    for order in ItemOrder:
+        response = client.get(
+            "/api/v1/items/", params={"order": order.value, "limit": 1}
+        )
+        cursor = response.headers["X-Next-Cursor"]
+
+        for other in set(ItemOrder) - {order}:
+            response = client.get(
+                "/api/v1/items/", params={"order": other.value, "cursor": cursor}
+            )
+            assert response.status_code == 400
+
+
+def test_get_item_runs_constant_number_of_queries(client, add_item, queries):
+    query_counts = []
+    for bounding_boxes in [1, 5]:
+        item_id = add_item(bounding_boxes=bounding_boxes)
+        queries.clear()
+
+        response = client.get(f"/api/v1/items/{item_id}")
+
+        assert len(response.json()["bounding_boxes"]) == bounding_boxes
+        query_counts.append(len(queries))
+
+    assert query_counts[0] == query_counts[1] <= 2
+
+
+def test_search_runs_constant_number_of_queries(client, add_item, queries):
+    query_counts = []
+    for items in [1, 10]:
+        for _ in range(items):
+            add_item(bounding_boxes=3)
+        queries.clear()
+
+        response = client.get("/api/v1/items/", params={"author_id": "user"})
+
+        assert len(response.json()) >= items
+        query_counts.append(len(queries))
+
+    assert query_counts[0] == query_counts[1] <= 2
+
+
+def test_collect_item_returns_committed_item(client, add_item):
+    item_id = add_item(bounding_boxes=2)
+
+    response = client.post(f"/api/v1/items/{item_id}/collect")
+
+    assert response.status_code == 200
+    assert response.json()["collected"] is True
+    assert len(response.json()["bounding_boxes"]) == 2
+    assert client.post(f"/api/v1/items/{item_id}/collect").status_code == 400
+
+
+def test_inverted_latitude_range_is_rejected():
+    # Rejected while building the query, before the database is used
+    client = TestClient(app, headers={"Authorization": "Bearer test"})
+
+    response = client.get(
+        "/api/v1/items/", params={"latitude_min": 10, "latitude_max": 5}
+    )
+
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "longitude_min, longitude_max", [(20, 22), (170, -170)], ids=["box", "antimeridian"]
+)
+def test_bounds_filter_uses_spatial_index(engine, longitude_min, longitude_max):
+    query = select(Item.id).where(_bounds_filter(52, 53, longitude_min, longitude_max))
+    sql = query.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+
+    async def explain() -> str:
+        async with engine.connect() as connection:
+            # The test table is small, for which a sequential scan is cheaper
+            await connection.execute(text("SET enable_seqscan = off"))
+            rows = await connection.execute(text(f"EXPLAIN {sql}"))
+            return "\n".join(row[0] for row in rows)
+
+    assert "idx_item_location_geometry" in asyncio.run(explain())
@@ -0,0 +1,32 @@
+import asyncio
+
+import asyncpg  # type: ignore
+
+from core import reference
+from core.reference import ReferenceListener
+
+
+def test_listener_reconnects_after_unexpected_errors(monkeypatch):
+    monkeypatch.setattr(reference, "RECONNECT_SECONDS", 0)
+    errors = [asyncpg.InterfaceError("connection is closed"), RuntimeError("bug")]
+
+    async def run() -> int:
+        listening = asyncio.Event()
+        attempts = 0
+
+        async def listen(dsn: str) -> None:
+            nonlocal attempts
+            attempts += 1
+            if errors:
+                raise errors.pop(0)
+            listening.set()
+            await asyncio.Event().wait()
+
+        listener = ReferenceListener()
+        monkeypatch.setattr(listener, "_listen", listen)
+        listener.start()
+        await asyncio.wait_for(listening.wait(), timeout=5)
+        await listener.stop()
+        return attempts
+
+    assert asyncio.run(run()) == 3
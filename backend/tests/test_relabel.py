@@ -0,0 +1,158 @@
+import asyncio
+import io
+import time
+from typing import Awaitable, Callable
+
+import numpy as np
+from PIL import Image
+
+from core.detection.detection import Detections
+from core.detection.relabel import CircuitBreaker, Relabeler
+
+RED, BLUE = (255, 0, 0), (0, 0, 255)
+DETECTOR_LABEL = 7
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeClient:
+    """
+    Stand-in for `google.genai.Client`, answering with `answer(color)` for the
+    color of each crop. Counts calls and the most calls in flight at once.
+    """
+
+    def __init__(self, answer: Callable[[tuple], Awaitable[str]]):
+        self.aio = self
+        self.models = self
+        self._answer = answer
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_content(self, model: str, contents: list) -> _Response:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            with Image.open(io.BytesIO(contents[0].inline_data.data)) as crop:
+                pixel = crop.convert("RGB").getpixel((2, 2))
+            color = RED if pixel[0] > pixel[2] else BLUE
+            return _Response(await self._answer(color))
+        finally:
+            self.in_flight -= 1
+
+
+def _image_and_detections(colors: list[tuple]) -> tuple[Image.Image, Detections]:
+    """An image with a 10x10 square of every color, each detected as a box."""
+    image = Image.new("RGB", (10 * len(colors), 10))
+    for i, color in enumerate(colors):
+        image.paste(color, (10 * i, 0, 10 * i + 10, 10))
+
+    boxes = np.array([[10 * i, 0, 10 * i + 10, 10] for i in range(len(colors))])
+    labels = np.full(len(colors), DETECTOR_LABEL)
+    return image, Detections(boxes=boxes, labels=labels)  # type: ignore[arg-type]
+
+
+def _relabeler(
+    client: _FakeClient,
+    max_concurrency: int = 16,
+    box_timeout: float = 5,
+    request_timeout: float = 10,
+    failure_threshold: int = 5,
+) -> Relabeler:
+    return Relabeler(
+        lambda: client,
+        max_concurrency=max_concurrency,
+        box_timeout=box_timeout,
+        request_timeout=request_timeout,
+        breaker=CircuitBreaker(failure_threshold, cooldown_seconds=60),
+    )
+
+
+def test_box_timeout_keeps_detector_label():
+    async def answer(color):
+        if color == RED:
+            await asyncio.sleep(10)
+        return "Glass"
+
+    relabeler = _relabeler(_FakeClient(answer), box_timeout=0.1)
+
+    result = asyncio.run(relabeler.relabel(*_image_and_detections([RED, BLUE])))
+
+    assert result.labels == [DETECTOR_LABEL, 1]
+    assert result.degraded
+    assert relabeler.stats().timeouts == 1
+
+
+def test_request_deadline_keeps_detector_labels():
+    async def answer(color):
+        if color == RED:
+            await asyncio.sleep(10)
+        return "Metal"
+
+    relabeler = _relabeler(_FakeClient(answer), request_timeout=0.2)
+
+    start = time.monotonic()
+    result = asyncio.run(relabeler.relabel(*_image_and_detections([RED, BLUE])))
+
+    assert time.monotonic() - start < 2
+    assert result.labels == [DETECTOR_LABEL, 2]
+    assert result.degraded
+
+
+def test_breaker_opens_after_failures_and_recovers():
+    failing = True
+
+    async def answer(color):
+        if failing:
+            raise ConnectionError("Gemini is down")
+        return "Paper"
+
+    client = _FakeClient(answer)
+    relabeler = _relabeler(client, failure_threshold=2)
+    image, detections = _image_and_detections([RED, BLUE])
+
+    async def run():
+        nonlocal failing
+        result = await relabeler.relabel(image, detections)
+        assert result.labels == [DETECTOR_LABEL] * 2 and result.degraded
+        assert client.calls == 2
+        assert relabeler.stats().breaker_open
+
+        # While open, Gemini is not called
+        result = await relabeler.relabel(image, detections)
+        assert result.labels == [DETECTOR_LABEL] * 2 and result.degraded
+        assert client.calls == 2
+        assert relabeler.stats().skipped_requests == 1
+
+        # After the cooldown, calls go through again and close it on success
+        failing = False
+        relabeler._breaker._opened_at -= 61  # type: ignore[operator]
+        result = await relabeler.relabel(image, detections)
+        assert result.labels == [0, 0] and not result.degraded
+        assert not relabeler.stats().breaker_open
+
+    asyncio.run(run())
+
+
+def test_concurrent_calls_are_capped():
+    async def answer(color):
+        await asyncio.sleep(0.05)
+        return "Plastic"
+
+    client = _FakeClient(answer)
+    relabeler = _relabeler(client, max_concurrency=2)
+    image, detections = _image_and_detections([RED, BLUE] * 3)
+
+    async def relabel_concurrently():
+        return await asyncio.gather(
+            *(relabeler.relabel(image, detections) for _ in range(2))
+        )
+
+    for result in asyncio.run(relabel_concurrently()):
+        assert result.labels == [3] * 6
+    assert client.calls == 12
+    assert client.max_in_flight == 2
@@ -0,0 +1,48 @@
+import asyncio
+import os
+
+from core.image_paths import VARIANTS, derivative_key
+from core.storage import LocalImageStorage, collect_orphans
+
+
+def _store(storage: LocalImageStorage, sha256: str) -> str:
+    source = storage.root / "upload.png"
+    source.write_bytes(sha256.encode())
+    key = storage.put(source, sha256, "PNG")
+
+    for variant in VARIANTS:
+        path = storage.root / derivative_key(key, variant)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"variant")
+
+    return key
+
+
+def test_delete_removes_variants(tmp_path):
+    storage = LocalImageStorage(tmp_path)
+    key = _store(storage, "a" * 64)
+
+    storage.delete(key)
+
+    assert not (tmp_path / key).exists()
+    for variant in VARIANTS:
+        assert not (tmp_path / derivative_key(key, variant)).exists()
+
+
+def test_collect_orphans_keeps_referenced_images(tmp_path, session_factory, add_item):
+    storage = LocalImageStorage(tmp_path)
+    referenced, orphaned = _store(storage, "a" * 64), _store(storage, "b" * 64)
+    add_item(image_path=storage.public_path(referenced))
+    # Stored before the grace period
+    for key in (referenced, orphaned):
+        os.utime(tmp_path / key, (0, 0))
+
+    async def collect() -> int:
+        async with session_factory() as session:
+            return await collect_orphans(session, storage)
+
+    assert asyncio.run(collect()) == 1
+    assert list(storage.keys()) == [referenced]
+    for variant in VARIANTS:
+        assert (tmp_path / derivative_key(referenced, variant)).exists()
+        assert not (tmp_path / derivative_key(orphaned, variant)).exists()
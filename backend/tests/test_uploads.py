@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import io
+import stat
+
+from fastapi import FastAPI, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from api.middleware import BodySizeLimitMiddleware
+from core import derivatives
+from core.images import decode_image
+from core.uploads import inspect_upload, save_upload
+
+
+def _png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_saved_upload_is_world_readable(tmp_path):
+    path = tmp_path / "uploads" / "image.png"
+    file = UploadFile(io.BytesIO(_png()), filename="image.png")
+
+    upload = asyncio.run(save_upload(file, path))
+
+    assert upload.image_format == "PNG"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o644
+
+
+def test_derivatives_are_world_readable(tmp_path, monkeypatch):
+    monkeypatch.setattr(derivatives, "IMAGE_ROOT", tmp_path)
+    (tmp_path / "image.png").write_bytes(_png())
+
+    derivatives.generate_derivatives("image.png")
+
+    for variant in derivatives.VARIANTS:
+        path = tmp_path / derivatives.derivative_key("image.png", variant)
+        assert stat.S_IMODE(path.stat().st_mode) == 0o644
+
+
+def test_inspected_upload_can_be_decoded():
+    contents = _png()
+    file = UploadFile(io.BytesIO(contents), filename="image.png")
+
+    upload = asyncio.run(inspect_upload(file))
+    decoded = decode_image(file.file)
+
+    assert upload.sha256 == hashlib.sha256(contents).hexdigest()
+    assert upload.size == len(contents)
+    assert decoded.image.size == (64, 48)
+
+
+def _limited_client(max_size: int) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_size=max_size)
+
+    @app.post("/upload")
+    def upload(file: UploadFile):
+        return {"filename": file.filename}
+
+    return TestClient(app)
+
+
+def test_body_size_limit():
+    client = _limited_client(max_size=len(_png()) + 1024)
+
+    response = client.post("/upload", files={"file": ("image.png", _png())})
+    assert response.status_code == 200
+
+    response = client.post("/upload", files={"file": ("big.png", bytes(10_000))})
+    assert response.status_code == 413
+
+
+def test_body_size_limit_without_content_length():
+    client = _limited_client(max_size=1000)
+
+    def chunks():
+        for _ in range(10):
+            yield bytes(500)
+
+    response = client.post(
+        "/upload",
+        content=chunks(),
+        headers={"Content-Type": "multipart/form-data; boundary=x"},
+    )
+    assert response.status_code == 413
@@ -0,0 +1,28 @@
+def _create_achievement(client, **fields) -> int:
+    response = client.post(
+        "/api/v1/achievements/",
+        json={"name": "Achievement", "description": "Description", **fields},
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_unlock_achievement(client):
+    achievement_id = _create_achievement(client)
+
+    response = client.post(f"/api/v1/users/user/achievements/{achievement_id}/unlock")
+
+    assert response.status_code == 200
+    assert response.json()["unlocked"]
+
+
+def test_rule_achievement_cannot_be_unlocked_manually(client):
+    achievement_id = _create_achievement(
+        client, rule_metric="items_reported", rule_threshold=10
+    )
+
+    response = client.post(f"/api/v1/users/user/achievements/{achievement_id}/unlock")
+    assert response.status_code == 403
+
+    response = client.get(f"/api/v1/users/user/achievements/{achievement_id}")
+    assert not response.json()["unlocked"]